@@ -1,26 +1,18 @@
 import os
 import cv2
-import torch
 import numpy as np
 from tqdm import tqdm
-from transformers import SegformerForSemanticSegmentation, AutoImageProcessor
+from runtime_config import apply_runtime_config
+from progress_events import track
+from deduplicate_frames import skip_duplicates, fan_out, frame_stem
+from empty_frames import load_empty_frames, write_empty_frame, image_size
+from shot_manifest import open_manifest
+from codecs_io import EXTENSIONS, READ_EXTENSIONS, stage_codec, frame_name, read_image, write_image
 import logging
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-# Ensure CUDA optimizations
-torch.backends.cuda.matmul.allow_tf32 = True
-torch.backends.cudnn.benchmark = True
-torch.backends.cudnn.allow_tf32 = True
-
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-# Load model
-MODEL_NAME = "nvidia/segformer-b3-finetuned-ade-512-512"
-processor = AutoImageProcessor.from_pretrained(MODEL_NAME)
-model = SegformerForSemanticSegmentation.from_pretrained(MODEL_NAME).to(device).eval()
-
 # Paths
 SEGFORMER_MASKS_DIR = "output/segformer_masks"  
 MOTION_VECTORS_DIR = "output/motion_vectors"
@@ -30,20 +22,20 @@ DEBUG_DIR = "output/debug"
 os.makedirs(OUTPUT_MASKS_DIR, exist_ok=True)
 os.makedirs(DEBUG_DIR, exist_ok=True)
 
-def process_frame(segformer_mask_path, motion_vector_path, output_path):
+def process_frame(segformer_mask_path, motion_vector_path, output_path, level=None):
     logging.info(f"Processing: {segformer_mask_path}")
 
     # Load SegFormer mask
-    mask = cv2.imread(segformer_mask_path, cv2.IMREAD_GRAYSCALE)
+    mask = read_image(segformer_mask_path, cv2.IMREAD_GRAYSCALE)
     if mask is None:
         logging.error(f"Failed to read SegFormer mask: {segformer_mask_path}")
-        return False
+        return None
 
-    # Load motion vector, check if it exists
-    if os.path.exists(motion_vector_path):
-        motion_vector = cv2.imread(motion_vector_path, cv2.IMREAD_GRAYSCALE)
+    # Load motion vector; None means the caller found none for this frame
+    if motion_vector_path is not None:
+        motion_vector = read_image(motion_vector_path, cv2.IMREAD_GRAYSCALE)
     else:
-        logging.warning(f"Motion vector missing for {motion_vector_path}. Using fallback.")
+        logging.warning(f"Motion vector missing for {segformer_mask_path}. Using fallback.")
         motion_vector = np.ones_like(mask) * 255  # Fallback to all white
 
     # Ensure size consistency by resizing **mask** to motion vector size
@@ -59,24 +51,44 @@ def process_frame(segformer_mask_path, motion_vector_path, output_path):
     refined_mask = cv2.bitwise_and(mask, motion_vector)
 
     # Save debug output
-    debug_path = output_path.replace(".png", "_debug.png")
-    cv2.imwrite(debug_path, refined_mask)
-    cv2.imwrite(output_path, refined_mask)
+    stem, ext = os.path.splitext(output_path)
+    data = write_image(output_path, refined_mask, level=level)
+    with open(stem + "_debug" + ext, "wb") as f:
+        f.write(data)
 
-    return True
+    return data
 
 def main():
-    frame_files = sorted([f for f in os.listdir(SEGFORMER_MASKS_DIR) if f.endswith(".png")])
+    apply_runtime_config("ai_processing")
+    manifest = open_manifest()
+    frame_files = manifest.frames("segformer_masks", READ_EXTENSIONS)
     if not frame_files:
         logging.error("No SegFormer masks found. Ensure SegFormer step ran first.")
         return
 
-    for frame_file in tqdm(frame_files, desc="Processing frames"):
-        segformer_mask_path = os.path.join(SEGFORMER_MASKS_DIR, frame_file)
-        motion_vector_path = os.path.join(MOTION_VECTORS_DIR, frame_file)
-        output_path = os.path.join(OUTPUT_MASKS_DIR, frame_file)
+    fmt, level = stage_codec("masks")
+    frame_files, duplicates = skip_duplicates(frame_files, OUTPUT_MASKS_DIR, EXTENSIONS[fmt])
+    empty_frames = load_empty_frames()
+    motion_vectors = manifest.frames_by_stem("motion_vectors")
 
-        process_frame(segformer_mask_path, motion_vector_path, output_path)
+    for frame_file in tqdm(track("ai_processing", frame_files), total=len(frame_files), desc="Processing frames"):
+        segformer_mask_path = os.path.join(SEGFORMER_MASKS_DIR, frame_file)
+        motion_vector = motion_vectors.get(frame_stem(frame_file))
+        motion_vector_path = os.path.join(MOTION_VECTORS_DIR, motion_vector) if motion_vector else None
+        output_file = frame_name(frame_file, fmt)
+        output_path = os.path.join(OUTPUT_MASKS_DIR, output_file)
+
+        if frame_stem(frame_file) in empty_frames:
+            # Real masks are resized to the motion vectors, so empty ones take the same size
+            data = write_empty_frame(output_path, image_size(motion_vector_path or segformer_mask_path), level)
+        else:
+            data = process_frame(segformer_mask_path, motion_vector_path, output_path, level)
+        if data is not None:
+            manifest.record("masks", output_file, data)
+
+    fan_out(OUTPUT_MASKS_DIR, duplicates, EXTENSIONS[fmt])
+    manifest.sync("masks")
+    manifest.hash_missing("masks")
 
     logging.info("AI Processing Completed! Masks saved in output/masks.")
 
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import multiprocessing
+import numpy as np
+import cv2
+
+CONFIG_FILE = "config.json"
+TRIAL_SECONDS = 3.0
+BATCH_SIZES = [1, 2, 4, 8, 16]
+
+def powers_of_two(limit):
+    values = [1]
+    while values[-1] * 2 <= limit:
+        values.append(values[-1] * 2)
+    if values[-1] != limit:
+        values.append(limit)
+    return values
+
+def synthetic_cutout(width, height):
+    frame = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    mask = np.zeros((height, width), np.uint8)
+    cv2.ellipse(mask, (width // 2, height // 2), (width // 6, height // 3), 0, 0, 360, 255, -1)
+    return frame, mask
+
+def cv2_trial(threads, seconds, width, height, results):
+    """Run the cutout + edge refinement + PNG encode workload in one process, as the stages do"""
+    from background_processing import apply_mask
+    from edge_refinement import refine_edges
+
+    cv2.setNumThreads(threads)
+    frame, mask = synthetic_cutout(width, height)
+    frames = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        refined = refine_edges(apply_mask(frame, mask))
+        cv2.imencode(".png", refined)
+        frames += 1
+    results.put(frames / (time.perf_counter() - start))
+
+def torch_trial(threads, interop, seconds, tiny, results):
+    """Measure SegFormer throughput for every batch size with one thread setting"""
+    import torch
+    import segformer_background_removal as segformer
+
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(interop)
+    if tiny:
+        from benchmark import install_tiny_segformer
+        install_tiny_segformer(segformer)
+    else:
+        segformer.load_model()
+    model = segformer.model
+
+    fps = {}
+    for batch_size in BATCH_SIZES:
+        inputs = torch.randn(batch_size, 3, 512, 512, device=segformer.device)
+        try:
+            with torch.no_grad():
+                model(pixel_values=inputs)  # Warm-up
+                frames = 0
+                start = time.perf_counter()
+                while time.perf_counter() - start < seconds / len(BATCH_SIZES):
+                    model(pixel_values=inputs)
+                    frames += batch_size
+                if segformer.device.type == "cuda":
+                    torch.cuda.synchronize()
+                fps[batch_size] = frames / (time.perf_counter() - start)
+        except RuntimeError:
+            break  # Out of memory; larger batches won't fit either
+    results.put(fps)
+
+def run_parallel(target, args_list):
+    """Run one spawned process per argument tuple at the same time and collect their results"""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=target, args=args + (results,)) for args in args_list]
+    for process in processes:
+        process.start()
+    values = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return values
+
+def tune_cv2(seconds, width, height):
+    """Best (threads, fps) for the OpenCV stages; each stage runs as a single process"""
+    best = None
+    print(f"{'threads':>8} {'fps':>10}")
+    for threads in powers_of_two(os.cpu_count() or 1):
+        fps = run_parallel(cv2_trial, [(threads, seconds, width, height)])[0]
+        print(f"{threads:8d} {fps:10.2f}")
+        if best is None or fps > best[1]:
+            best = (threads, fps)
+    return best
+
+def tune_torch(seconds, tiny):
+    """Best (threads, interop threads, batch size) for SegFormer inference"""
+    cpus = os.cpu_count() or 1
+    best = None
+    print(f"{'threads':>8} {'interop':>8} {'batch':>6} {'fps':>10}")
+    for threads in powers_of_two(cpus):
+        for interop in sorted({1, 2} & set(range(1, cpus + 1))):
+            fps_by_batch = run_parallel(torch_trial, [(threads, interop, seconds, tiny)])[0]
+            for batch_size, fps in fps_by_batch.items():
+                print(f"{threads:8d} {interop:8d} {batch_size:6d} {fps:10.2f}")
+                if best is None or fps > best[3]:
+                    best = (threads, interop, batch_size, fps)
+    return best
+
+def save_runtime(runtime, config_file=CONFIG_FILE):
+    with open(config_file, "r") as f:
+        config = json.load(f)
+    # Keep hand-written per-stage overrides
+    runtime["stages"] = config.get("runtime", {}).get("stages", {})
+    config["runtime"] = runtime
+    with open(config_file, "w") as f:
+        json.dump(config, f, indent=4)
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the best thread and batch settings for this machine")
+    parser.add_argument("--seconds", type=float, default=TRIAL_SECONDS, help="Length of each trial")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--tiny", action="store_true", help="Use a tiny random SegFormer (no download; batch size is then only indicative)")
+    parser.add_argument("--skip-torch", action="store_true", help="Only tune the OpenCV stages")
+    parser.add_argument("--dry-run", action="store_true", help="Print the result without writing config.json")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    runtime = {}
+
+    print("Tuning OpenCV stages...")
+    cv2_threads, cv2_fps = tune_cv2(args.seconds, args.width, args.height)
+    runtime["cv2_threads"] = cv2_threads
+
+    if not args.skip_torch:
+        print("Tuning SegFormer inference...")
+        torch_threads, interop, batch_size, torch_fps = tune_torch(args.seconds, args.tiny)
+        runtime.update({"torch_threads": torch_threads, "torch_interop_threads": interop, "batch_size": batch_size})
+
+    runtime["tuned"] = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "cpu_count": os.cpu_count(),
+        "resolution": f"{args.width}x{args.height}",
+        "cv2_fps": round(cv2_fps, 2),
+    }
+    if not args.skip_torch:
+        runtime["tuned"]["segformer_fps"] = round(torch_fps, 2)
+    print(json.dumps(runtime, indent=4))
+    if not args.dry_run:
+        save_runtime(runtime)
+        print(f"Saved to {CONFIG_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -2,46 +2,73 @@ import os
 import cv2
 import numpy as np
 from tqdm import tqdm
+from runtime_config import apply_runtime_config
+from progress_events import track
+from deduplicate_frames import skip_duplicates, fan_out, frame_stem
+from empty_frames import load_empty_frames, write_empty_frame, image_size
+from shot_manifest import open_manifest
+from codecs_io import EXTENSIONS, stage_codec, frame_name, read_image, write_image
 
 INPUT_DIR = "output/original_frames"
 MASKS_DIR = "output/masks"
 OUTPUT_DIR = "output/cutouts"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def create_cutout(image_path, mask_path, output_path):
-    """Create transparent cutout using mask"""
-    # Load images
-    image = cv2.imread(image_path)
-    mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
-    
-    if image is None or mask is None:
-        print(f"Error loading files for {image_path}")
-        return False
-        
+def apply_mask(image, mask, out=None):
+    """Combine a BGR image and a mask into a BGRA cutout, written into `out` if given"""
     # Ensure mask matches image size
     if mask.shape != image.shape[:2]:
         mask = cv2.resize(mask, (image.shape[1], image.shape[0]), cv2.INTER_NEAREST)
     
     # Create RGBA image
-    rgba = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+    rgba = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA, dst=out)
     rgba[:, :, 3] = mask
+    return rgba
+
+def create_cutout(image_path, mask_path, output_path, level=None):
+    """Create transparent cutout using mask; returns the written bytes, or None on failure"""
+    # Load images
+    image = cv2.imread(image_path)
+    mask = read_image(mask_path, cv2.IMREAD_GRAYSCALE)
+    
+    if image is None or mask is None:
+        print(f"Error loading files for {image_path}")
+        return None
+        
+    rgba = apply_mask(image, mask)
     
     # Save with transparency
-    cv2.imwrite(output_path, rgba)
-    return True
+    return write_image(output_path, rgba, level=level)
 
 def main():
-    frame_files = sorted([f for f in os.listdir(INPUT_DIR) if f.endswith('.png')])
+    apply_runtime_config("cutouts")
+    manifest = open_manifest()
+    frame_files = manifest.frames("original_frames", '.png')
     
-    for frame_file in tqdm(frame_files, desc="Creating cutouts"):
+    fmt, level = stage_codec("cutouts")
+    frame_files, duplicates = skip_duplicates(frame_files, OUTPUT_DIR, EXTENSIONS[fmt])
+    empty_frames = load_empty_frames()
+    masks = manifest.frames_by_stem("masks")
+
+    for frame_file in tqdm(track("cutouts", frame_files), total=len(frame_files), desc="Creating cutouts"):
         image_path = os.path.join(INPUT_DIR, frame_file)
-        mask_path = os.path.join(MASKS_DIR, frame_file)
-        output_path = os.path.join(OUTPUT_DIR, frame_file)
+        mask_file = masks.get(frame_stem(frame_file))
+        output_file = frame_name(frame_file, fmt)
+        output_path = os.path.join(OUTPUT_DIR, output_file)
         
-        if os.path.exists(mask_path):
-            create_cutout(image_path, mask_path, output_path)
-        else:
+        if frame_stem(frame_file) in empty_frames:
+            data = write_empty_frame(output_path, image_size(image_path) + (4,), level)
+        elif mask_file is None:
             print(f"Missing mask for {frame_file}")
+            continue
+        else:
+            data = create_cutout(image_path, os.path.join(MASKS_DIR, mask_file), output_path, level)
+        if data is not None:
+            manifest.record("cutouts", output_file, data)
+
+    fan_out(OUTPUT_DIR, duplicates, EXTENSIONS[fmt])
+    manifest.sync("cutouts")
+    manifest.hash_missing("cutouts")
 
 if __name__ == "__main__":
     main()
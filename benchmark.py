@@ -0,0 +1,320 @@
+import os
+import gc
+import sys
+import json
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import cv2
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+EXAMPLE_DIR = os.path.join(REPO_DIR, "example_pipeline_images")
+BASELINE_FILE = os.path.join(REPO_DIR, "benchmark_baseline.json")
+DEFAULT_THRESHOLD = 0.25  # Allowed relative slowdown / memory growth
+
+STAGES = ["segformer", "ai_processing", "cutout", "edge_refinement", "refine_masks"]
+
+def synthetic_frame(index, width, height):
+    """Generate a frame with a moving person-shaped blob over a gradient"""
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    frame = np.dstack([
+        np.broadcast_to(x, (height, width)),
+        np.broadcast_to(y, (height, width)),
+        np.full((height, width), (index * 7) % 255, dtype=np.float32),
+    ]).astype(np.uint8)
+    center = (int(width * (0.3 + 0.4 * (index % 30) / 30)), height // 2)
+    cv2.ellipse(frame, center, (width // 10, height // 3), 0, 0, 360, (40, 90, 200), -1)
+    return frame
+
+def load_example_frames(width, height):
+    """Load the example originals and masks, resized to the requested resolution"""
+    pairs = []
+    for frame_path in sorted(glob.glob(os.path.join(EXAMPLE_DIR, "or_frame_*.png"))):
+        mask_path = frame_path.replace("or_frame_", "m_frame_")
+        frame = cv2.imread(frame_path, cv2.IMREAD_UNCHANGED)
+        mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+        if frame is None or mask is None:
+            continue
+        if frame.dtype == np.uint16:
+            frame = (frame >> 8).astype(np.uint8)
+        frame = cv2.resize(frame[:, :, :3], (width, height), interpolation=cv2.INTER_AREA)
+        mask = cv2.resize(mask, (width, height), interpolation=cv2.INTER_NEAREST)
+        pairs.append((frame, mask))
+    return pairs
+
+def build_shot(shot_dir, num_frames, width, height, source="examples"):
+    """Write a synthetic shot of num_frames frames into shot_dir/output"""
+    output_dir = os.path.join(shot_dir, "output")
+    for name in ["original_frames", "segformer_masks", "motion_vectors", "masks", "cutouts"]:
+        os.makedirs(os.path.join(output_dir, name), exist_ok=True)
+
+    examples = load_example_frames(width, height) if source == "examples" else []
+    if source == "examples" and not examples:
+        print(f"No example frames found in {EXAMPLE_DIR}, falling back to generated frames")
+
+    frame_files = []
+    for i in range(num_frames):
+        if examples:
+            frame, mask = examples[i % len(examples)]
+            # Shift every frame slightly so no two frames in the shot are identical
+            frame = np.roll(frame, i, axis=1)
+            mask = np.roll(mask, i, axis=1)
+        else:
+            frame = synthetic_frame(i, width, height)
+            mask = np.where(frame[:, :, 2] == 200, 255, 0).astype(np.uint8)
+
+        motion = cv2.dilate(mask, np.ones((15, 15), np.uint8))
+        rgba = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+        rgba[:, :, 3] = mask
+
+        frame_file = f"frame_{i + 1:04d}.png"
+        cv2.imwrite(os.path.join(output_dir, "original_frames", frame_file), frame)
+        cv2.imwrite(os.path.join(output_dir, "segformer_masks", frame_file), mask)
+        cv2.imwrite(os.path.join(output_dir, "motion_vectors", frame_file), motion)
+        cv2.imwrite(os.path.join(output_dir, "masks", frame_file), mask)
+        cv2.imwrite(os.path.join(output_dir, "cutouts", frame_file), rgba)
+        frame_files.append(frame_file)
+
+    return output_dir, frame_files
+
+def install_tiny_segformer(seg):
+    """Swap the B3 model in segformer_background_removal for a tiny random one"""
+    import torch
+    from transformers import SegformerConfig, SegformerForSemanticSegmentation, SegformerImageProcessor
+
+    torch.manual_seed(0)
+    config = SegformerConfig(
+        num_labels=150,
+        depths=[1, 1, 1, 1],
+        hidden_sizes=[8, 16, 32, 64],
+        num_attention_heads=[1, 1, 2, 4],
+        decoder_hidden_size=32,
+    )
+    seg.processor = SegformerImageProcessor(size={"height": 128, "width": 128})
+    seg.model = SegformerForSemanticSegmentation(config).to(seg.device).eval()
+
+def stage_jobs(output_dir, frame_files, stages=STAGES):
+    """Return a (setup, run_one) pair for every requested stage"""
+    # Stage modules create their output dirs relative to cwd on import, and only SegFormer needs torch,
+    # so only the requested stages are imported
+    if "segformer" in stages:
+        import segformer_background_removal
+    if "ai_processing" in stages:
+        import ai_processing
+    if "cutout" in stages:
+        import background_processing
+    if "edge_refinement" in stages:
+        import edge_refinement
+    if "refine_masks" in stages:
+        import refine_masks
+
+    def path(folder, frame_file):
+        return os.path.join(output_dir, folder, frame_file)
+
+    def bench_dir(folder):
+        os.makedirs(os.path.join(output_dir, folder), exist_ok=True)
+
+    cutouts = {}
+
+    def setup_segformer():
+        install_tiny_segformer(segformer_background_removal)
+        bench_dir("bench_masks")
+
+    def setup_edges():
+        cutouts.clear()
+        for frame_file in frame_files:
+            cutouts[frame_file] = cv2.imread(path("cutouts", frame_file), cv2.IMREAD_UNCHANGED)
+
+    jobs = {
+        "segformer": lambda: (setup_segformer, lambda f: segformer_background_removal.process_frame(
+            path("original_frames", f), path("bench_masks", f))),
+        "ai_processing": lambda: (lambda: bench_dir("bench_ai_masks"), lambda f: ai_processing.process_frame(
+            path("segformer_masks", f), path("motion_vectors", f), path("bench_ai_masks", f))),
+        "cutout": lambda: (lambda: bench_dir("bench_cutouts"), lambda f: background_processing.create_cutout(
+            path("original_frames", f), path("masks", f), path("bench_cutouts", f))),
+        "edge_refinement": lambda: (setup_edges, lambda f: edge_refinement.refine_edges(cutouts[f])),
+        "refine_masks": lambda: (lambda: bench_dir("bench_refined"), lambda f: refine_masks.refine_mask(
+            path("masks", f), path("motion_vectors", f), path("bench_refined", f))),
+    }
+    return {stage: jobs[stage]() for stage in stages}
+
+def current_rss():
+    """Resident memory of this process in bytes"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    with open("/proc/self/statm", "r") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def reset_peak_rss():
+    """Reset the kernel's peak-RSS counter (VmHWM, Linux only); False when unsupported"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def read_peak_rss():
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return None
+
+class PeakRSS:
+    """Peak resident memory reached inside a `with` block, above the RSS at its start.
+
+    Unlike tracemalloc this also counts torch tensors and OpenCV's native
+    buffers. Linux's own high-water mark is used when it can be reset;
+    elsewhere RSS is sampled on a background thread with psutil.
+    """
+
+    SAMPLE_INTERVAL = 0.002
+
+    def __enter__(self):
+        self.start = current_rss()
+        self.peak = self.start
+        self.sampler = None
+        self.kernel = reset_peak_rss() and read_peak_rss() is not None
+        if not self.kernel and psutil is not None:
+            self.running = True
+            self.sampler = threading.Thread(target=self._sample, daemon=True)
+            self.sampler.start()
+        return self
+
+    def _sample(self):
+        while self.running:
+            self.peak = max(self.peak, current_rss())
+            time.sleep(self.SAMPLE_INTERVAL)
+
+    def __exit__(self, *exc):
+        if self.sampler is not None:
+            self.running = False
+            self.sampler.join()
+        if self.kernel:
+            self.peak = max(self.peak, read_peak_rss())
+        self.peak = max(self.peak, current_rss())
+        return False
+
+    @property
+    def delta(self):
+        return max(0, self.peak - self.start)
+
+def measure_stage(setup, run_one, frame_files, warmup=1, memory_frames=3):
+    """Peak memory of setting a stage up and running a few frames, then its speed over all frames"""
+    # Resident memory includes the model, torch tensors and OpenCV's native buffers. The first
+    # frames are where a stage allocates, so the peak is taken there rather than in the timed pass.
+    gc.collect()
+    with PeakRSS() as memory:
+        setup()
+        for frame_file in frame_files[:max(warmup, memory_frames)]:
+            run_one(frame_file)
+
+    start = time.perf_counter()
+    for frame_file in frame_files:
+        run_one(frame_file)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "fps": len(frame_files) / elapsed if elapsed > 0 else 0.0,
+        "ms_per_frame": 1000.0 * elapsed / len(frame_files),
+        "peak_mb": memory.delta / (1024 * 1024),
+    }
+
+def run_benchmark(num_frames, width, height, source="examples", stages=None, keep_dir=None):
+    """Build a shot and benchmark every requested stage on it"""
+    stages = stages or STAGES
+    shot_dir = keep_dir or tempfile.mkdtemp(prefix="ai_vfx_bench_")
+    os.makedirs(shot_dir, exist_ok=True)
+    cwd = os.getcwd()
+    sys.path.insert(0, REPO_DIR)
+    try:
+        os.chdir(shot_dir)
+        output_dir, frame_files = build_shot(shot_dir, num_frames, width, height, source)
+        jobs = stage_jobs(output_dir, frame_files, stages)
+        results = {}
+        for stage in stages:
+            setup, run_one = jobs[stage]
+            results[stage] = measure_stage(setup, run_one, frame_files)
+            print(f"{stage:16s} {results[stage]['fps']:8.2f} fps "
+                  f"{results[stage]['ms_per_frame']:8.2f} ms/frame "
+                  f"{results[stage]['peak_mb']:8.2f} MB peak")
+        return results
+    finally:
+        os.chdir(cwd)
+        if keep_dir is None:
+            shutil.rmtree(shot_dir, ignore_errors=True)
+
+def baseline_key(num_frames, width, height, source):
+    return f"{source}_{width}x{height}_{num_frames}f"
+
+def load_baseline(baseline_file=BASELINE_FILE):
+    if not os.path.exists(baseline_file):
+        return {}
+    with open(baseline_file, "r") as f:
+        return json.load(f)
+
+def save_baseline(baseline, baseline_file=BASELINE_FILE):
+    with open(baseline_file, "w") as f:
+        json.dump(baseline, f, indent=4)
+
+def find_regressions(results, reference, threshold=DEFAULT_THRESHOLD):
+    """Compare results to a baseline entry and list every stage over the threshold"""
+    regressions = []
+    for stage, current in results.items():
+        base = reference.get(stage)
+        if not base:
+            continue
+        if current["fps"] < base["fps"] * (1.0 - threshold):
+            regressions.append(f"{stage}: {current['fps']:.2f} fps vs baseline {base['fps']:.2f} fps")
+        if base["peak_mb"] > 0 and current["peak_mb"] > base["peak_mb"] * (1.0 + threshold):
+            regressions.append(f"{stage}: {current['peak_mb']:.2f} MB vs baseline {base['peak_mb']:.2f} MB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on a synthetic shot")
+    parser.add_argument("--frames", type=int, default=24, help="Number of frames in the synthetic shot")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--source", choices=["examples", "generated"], default="examples",
+                        help="Build frames from example_pipeline_images or generate them")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative regression before failing (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--keep", metavar="DIR", help="Build the shot in DIR and keep it afterwards")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.frames, args.width, args.height, args.source, args.stages, args.keep)
+    key = baseline_key(args.frames, args.width, args.height, args.source)
+    baseline = load_baseline(args.baseline)
+
+    if args.update_baseline or key not in baseline:
+        baseline.setdefault(key, {}).update(results)
+        save_baseline(baseline, args.baseline)
+        print(f"Baseline '{key}' saved to {args.baseline}")
+        return 0
+
+    regressions = find_regressions(results, baseline[key], args.threshold)
+    if regressions:
+        print(f"Performance regression over {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+
+    print(f"No regressions against baseline '{key}'")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,17 @@
+import io
 import os
 import json
-import glob
+import base64
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from jinja2 import Template
 from fpdf import FPDF
 import cv2
+import numpy as np
+from thumbnail_cache import make_thumbnail
+from runtime_config import apply_runtime_config, stage_setting
+from shot_manifest import open_manifest
+from codecs_io import READ_EXTENSIONS, read_image
 
 # Load configuration
 CONFIG_FILE = "config.json"
@@ -14,8 +22,14 @@ OUTPUT_DIR = config["output_dir"]
 REPORT_FILE_HTML = "pipeline_report.html"
 REPORT_FILE_PDF = "pipeline_report.pdf"
 
-# Collect first image from each output directory
+THUMBNAIL_SIZE = 400
+METRIC_SAMPLES = 200  # Frames per stage decoded for metrics; larger stages are strided
+WORST_FRAMES = 2
+WORKERS = stage_setting("workers", min(8, os.cpu_count() or 1), "report")  # Thumbnail threads
+
+# Stages to include in the report
 expected_folders = [
+    "original_frames",
     "cutouts",
     "extract_motion_vectors",
     "generate_transparent_pngs",
@@ -25,16 +39,105 @@ expected_folders = [
     "refined_masks",
     "run_ai_processing",
     "run_segformer",
-    "segformer_masks"
+    "segformer_masks",
+    "final_cutouts"
 ]
 
-images = []
-for folder in expected_folders:
-    folder_path = os.path.join(OUTPUT_DIR, folder)
-    if os.path.exists(folder_path):
-        image_files = sorted(glob.glob(os.path.join(folder_path, "*.png")))
-        if image_files:
-            images.append({"name": folder.replace("_", " ").title(), "path": image_files[0]})
+def frame_index(manifest, folder):
+    """Sorted (name, size) of the image frames of a stage, from the shot manifest"""
+    return [(name, size) for name, size, _, _ in manifest.rows(folder) if name.lower().endswith(READ_EXTENSIONS)]
+
+def frame_metric(path):
+    """Mask coverage (alpha or single channel) or mean brightness of a frame, in percent"""
+    image = read_image(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None, None
+    if image.ndim == 2:
+        return "coverage", 100.0 * np.count_nonzero(image) / image.size
+    if image.shape[2] == 4:
+        return "coverage", 100.0 * np.count_nonzero(image[:, :, 3]) / image[:, :, 3].size
+    scale = 65535.0 if image.dtype == np.uint16 else 255.0
+    return "brightness", 100.0 * float(image.mean()) / scale
+
+def stage_metrics(folder_path, names, executor):
+    """Summary metrics for a stage plus the names of its worst (most jumpy) frames"""
+    stride = max(1, len(names) // METRIC_SAMPLES)
+    sampled = names[::stride]
+    results = list(executor.map(frame_metric, [os.path.join(folder_path, name) for name in sampled]))
+    values = [(name, value) for name, (_, value) in zip(sampled, results) if value is not None]
+    kind = next((k for k, _ in results if k), "coverage")
+    if not values:
+        return {"metric": kind}, []
+
+    series = np.array([value for _, value in values])
+    jumps = np.abs(np.diff(series, prepend=series[0]))
+    worst = [values[i][0] for i in np.argsort(jumps)[::-1][:WORST_FRAMES] if jumps[i] > 0]
+    metrics = {
+        "metric": kind,
+        "mean": float(series.mean()),
+        "std": float(series.std()),
+        "max_jump": float(jumps.max()),
+        "sampled": len(values),
+    }
+    return metrics, worst
+
+def select_samples(names, worst):
+    """First, middle and last frame, followed by any worst-metric frames not already picked"""
+    picks = [("first", names[0]), ("middle", names[len(names) // 2]), ("last", names[-1])]
+    seen = set()
+    samples = []
+    for label, name in picks + [("worst", name) for name in worst]:
+        if name not in seen:
+            seen.add(name)
+            samples.append({"label": label, "name": name})
+    return samples
+
+def encode_thumbnail(path):
+    data = make_thumbnail(path, THUMBNAIL_SIZE)
+    if data is None:
+        return None
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+    return {"data": data, "width": image.shape[1], "height": image.shape[0]}
+
+def collect_stages(output_dir=OUTPUT_DIR, folders=expected_folders):
+    """Index every stage, compute its metrics and encode its sample thumbnails in parallel"""
+    stages = []
+    manifest = open_manifest(output_dir)
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        for folder in folders:
+            folder_path = os.path.join(output_dir, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            index = frame_index(manifest, folder)
+            if not index:
+                continue
+            names = [name for name, _ in index]
+            metrics, worst = stage_metrics(folder_path, names, executor)
+            metrics["frames"] = len(names)
+            metrics["size_mb"] = sum(size for _, size in index) / (1024 * 1024)
+            stages.append({
+                "name": folder.replace("_", " ").title(),
+                "path": folder_path,
+                "metrics": metrics,
+                "samples": select_samples(names, worst),
+            })
+
+        # Decode and encode every sample of every stage at once
+        samples = [(stage, sample) for stage in stages for sample in stage["samples"]]
+        thumbnails = executor.map(encode_thumbnail, [os.path.join(stage["path"], sample["name"]) for stage, sample in samples])
+        for (stage, sample), thumbnail in zip(samples, thumbnails):
+            sample["thumbnail"] = thumbnail
+            if thumbnail:
+                sample["uri"] = "data:image/jpeg;base64," + base64.b64encode(thumbnail["data"]).decode("ascii")
+    return stages
+
+def describe_metrics(metrics):
+    text = f"{metrics['frames']} frames, {metrics['size_mb']:.1f} MB"
+    if "mean" in metrics:
+        text += (f" | {metrics['metric']} mean {metrics['mean']:.1f}% "
+                 f"(std {metrics['std']:.1f}, max jump {metrics['max_jump']:.1f}) "
+                 f"over {metrics['sampled']} sampled frames")
+    return text
 
 # HTML Report Template
 html_template = Template('''
@@ -46,18 +149,30 @@ html_template = Template('''
     <title>AI VFX Pipeline Report</title>
     <style>
         body { font-family: Arial, sans-serif; margin: 40px; }
-        .container { max-width: 800px; margin: auto; }
+        .container { max-width: 1100px; margin: auto; }
         .step { margin-bottom: 20px; }
+        .metrics { color: #555; }
+        .strip { display: flex; gap: 8px; }
+        figure { margin: 0; }
+        figcaption { font-size: 12px; color: #555; }
         img { max-width: 100%; height: auto; border: 1px solid #ddd; padding: 5px; }
     </style>
 </head>
 <body>
     <div class="container">
         <h1>AI VFX Pipeline Report</h1>
-        {% for image in images %}
+        {% for stage in stages %}
         <div class="step">
-            <h2>{{ image.name }}</h2>
-            <img src="{{ image.path }}" alt="{{ image.name }}">
+            <h2>{{ stage.name }}</h2>
+            <p class="metrics">{{ stage.summary }}</p>
+            <div class="strip">
+            {% for sample in stage.samples if sample.uri %}
+                <figure>
+                    <img src="{{ sample.uri }}" alt="{{ sample.name }}">
+                    <figcaption>{{ sample.label }}: {{ sample.name }}</figcaption>
+                </figure>
+            {% endfor %}
+            </div>
         </div>
         {% endfor %}
     </div>
@@ -65,30 +180,64 @@ html_template = Template('''
 </html>
 ''')
 
-# Generate HTML Report
-html_content = html_template.render(images=images)
-with open(REPORT_FILE_HTML, "w", encoding="utf-8") as f:
-    f.write(html_content)
-
-# Generate PDF Report
-pdf = FPDF()
-pdf.set_auto_page_break(auto=True, margin=10)
-pdf.add_page()
-pdf.set_font("Arial", "B", 16)
-pdf.cell(0, 10, "AI VFX Pipeline Report", ln=True, align="C")
-pdf.ln(10)
-
-for image in images:
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, image["name"], ln=True)
-    pdf.ln(5)
-    img = cv2.imread(image["path"])
-    if img is not None:
-        temp_image = "temp.jpg"
-        cv2.imwrite(temp_image, img, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
-        pdf.image(temp_image, x=10, w=100)
+def write_html(stages, report_file=REPORT_FILE_HTML):
+    with open(report_file, "w", encoding="utf-8") as f:
+        f.write(html_template.render(stages=stages))
+
+def pdf_image(pdf, data, directory, **kwargs):
+    """Place an in-memory JPEG; classic fpdf 1.7 only takes file paths, so fall back to a temporary file"""
+    try:
+        pdf.image(io.BytesIO(data), **kwargs)
+    except AttributeError:
+        path = os.path.join(directory, f"{len(os.listdir(directory))}.jpg")
+        with open(path, "wb") as f:
+            f.write(data)
+        pdf.image(path, **kwargs)
+
+def write_pdf(stages, report_file=REPORT_FILE_PDF):
+    with tempfile.TemporaryDirectory() as directory:
+        _write_pdf(stages, report_file, directory)
+
+def _write_pdf(stages, report_file, directory):
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=10)
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, "AI VFX Pipeline Report", ln=True, align="C")
     pdf.ln(10)
 
-pdf.output(REPORT_FILE_PDF)
+    page_width = pdf.w - 2 * pdf.l_margin
+    for stage in stages:
+        thumbnails = [sample for sample in stage["samples"] if sample["thumbnail"]]
+        strip_width = page_width / max(len(thumbnails), 1) - 2
+        strip_height = max((strip_width * s["thumbnail"]["height"] / s["thumbnail"]["width"] for s in thumbnails), default=0)
+        if pdf.get_y() + 30 + strip_height > pdf.h - pdf.b_margin:
+            pdf.add_page()
+
+        pdf.set_font("Arial", "B", 14)
+        pdf.cell(0, 10, stage["name"], ln=True)
+        pdf.set_font("Arial", "", 9)
+        pdf.multi_cell(0, 5, stage["summary"])
+        pdf.ln(2)
+
+        y = pdf.get_y()
+        for i, sample in enumerate(thumbnails):
+            x = pdf.l_margin + i * (strip_width + 2)
+            pdf_image(pdf, sample["thumbnail"]["data"], directory, x=x, y=y, w=strip_width)
+            pdf.set_xy(x, y + strip_height + 1)
+            pdf.cell(strip_width, 4, f"{sample['label']}: {sample['name']}")
+        pdf.set_xy(pdf.l_margin, y + strip_height + 8)
+
+    pdf.output(report_file)
+
+def main():
+    apply_runtime_config("report")
+    stages = collect_stages()
+    for stage in stages:
+        stage["summary"] = describe_metrics(stage["metrics"])
+    write_html(stages)
+    write_pdf(stages)
+    print(f" Pipeline reports generated: {REPORT_FILE_HTML}, {REPORT_FILE_PDF}")
 
-print(f" Pipeline reports generated: {REPORT_FILE_HTML}, {REPORT_FILE_PDF}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import time
+import argparse
+import statistics
+import cv2
+import numpy as np
+import codecs_io
+
+EXAMPLE_DIR = "example_pipeline_images"
+REPEATS = 5
+
+# Example image prefix -> kind of intermediate it stands for
+KINDS = {"or_frame": "frame (BGR)", "fc_frame": "cutout (BGRA)", "m_frame": "mask (gray)"}
+
+# (label, format, level) combinations to compare
+CANDIDATES = [
+    ("png level 0", "png", 0),
+    ("png level 1", "png", 1),
+    ("png level 3", "png", 3),
+    ("png level 6", "png", 6),
+    ("png level 9", "png", 9),
+    ("tiff (none)", "tiff", None),
+    ("npy (raw)", "npy", None),
+    ("qoi", "qoi", None),
+    ("exr half", "exr", None),
+]
+
+def load_examples(example_dir=EXAMPLE_DIR):
+    """kind -> list of example images; masks are scaled to the frame size the later stages use"""
+    examples = {}
+    frame_size = None
+    for name in sorted(os.listdir(example_dir)):
+        prefix = name.rsplit("_", 1)[0]
+        if prefix not in KINDS:
+            continue
+        image = cv2.imread(os.path.join(example_dir, name), cv2.IMREAD_UNCHANGED)
+        if prefix == "or_frame":
+            frame_size = image.shape[1], image.shape[0]
+        examples.setdefault(prefix, []).append(image)
+    if frame_size and "m_frame" in examples:
+        examples["m_frame"] = [cv2.resize(m, frame_size, interpolation=cv2.INTER_NEAREST) for m in examples["m_frame"]]
+    return examples
+
+def time_call(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+def measure(images, fmt, level, repeats):
+    """Median encode/decode milliseconds and mean size (KB) over the images"""
+    encode_ms, decode_ms, sizes = [], [], []
+    for image in images:
+        seconds, data = time_call(lambda: codecs_io.encode(image, fmt, level), repeats)
+        encode_ms.append(seconds * 1000)
+        sizes.append(len(data) / 1024)
+        seconds, _ = time_call(lambda: codecs_io.decode(data, fmt), repeats)
+        decode_ms.append(seconds * 1000)
+    return statistics.mean(encode_ms), statistics.mean(decode_ms), statistics.mean(sizes)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare encode/decode speed and size of the intermediate codecs on the example frames")
+    parser.add_argument("--examples", default=EXAMPLE_DIR)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--markdown", action="store_true", help="Print a Markdown table")
+    args = parser.parse_args()
+
+    examples = load_examples(args.examples)
+    if not examples:
+        print(f"No example images found in {args.examples}")
+        return
+
+    rows = []
+    skipped = []
+    for label, fmt, level in CANDIDATES:
+        if not codecs_io.available(fmt):
+            skipped.append(label)
+            continue
+        try:
+            for prefix, images in examples.items():
+                encode_ms, decode_ms, size_kb = measure(images, fmt, level, args.repeats)
+                h, w = images[0].shape[:2]
+                rows.append((KINDS[prefix] + f" {w}x{h}", label, encode_ms, decode_ms, size_kb))
+        except RuntimeError:
+            skipped.append(label)  # e.g. EXR with neither OpenCV support nor the OpenEXR package
+    rows.sort(key=lambda row: row[0])
+
+    header = ("image", "codec", "encode ms", "decode ms", "size KB")
+    if args.markdown:
+        print("| " + " | ".join(header) + " |")
+        print("|" + "---|" * len(header))
+        for kind, label, enc, dec, size in rows:
+            print(f"| {kind} | {label} | {enc:.2f} | {dec:.2f} | {size:.0f} |")
+    else:
+        print(f"{header[0]:<28} {header[1]:<12} {header[2]:>10} {header[3]:>10} {header[4]:>10}")
+        for kind, label, enc, dec, size in rows:
+            print(f"{kind:<28} {label:<12} {enc:10.2f} {dec:10.2f} {size:10.0f}")
+    if skipped:
+        print(f"\nNot available here: {', '.join(skipped)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import os
+import io
+import json
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+
+# OpenCV only reads and writes EXR when this is set before its first image read or write
+os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+import cv2
+
+try:
+    import qoi  # Optional: pip install qoi
+except ImportError:
+    qoi = None
+
+try:
+    import OpenEXR  # Optional: used for EXR when OpenCV was built without it
+    import Imath
+except ImportError:
+    OpenEXR = None
+
+CONFIG_FILE = "config.json"
+
+# Format -> file extension. Stages look frames up by name stem plus their input stage's extension.
+EXTENSIONS = {
+    "png": ".png",
+    "tiff": ".tiff",
+    "qoi": ".qoi",
+    "npy": ".npy",
+    "exr": ".exr",
+}
+FORMATS = list(EXTENSIONS)
+READ_EXTENSIONS = tuple(EXTENSIONS.values()) + (".tif", ".jpg", ".jpeg")
+DEFAULT_CODEC = {"format": "png", "level": 1}
+
+# EXR compression name -> OpenCV IMWRITE_EXR_COMPRESSION value (same numbering as OpenEXR)
+EXR_COMPRESSION = {"none": 0, "rle": 1, "zips": 2, "zip": 3, "piz": 4}
+
+def available(fmt):
+    """Whether this environment can write `fmt`"""
+    if fmt == "qoi":
+        return qoi is not None
+    if fmt == "exr":
+        return cv2.haveImageWriter(".exr") or OpenEXR is not None
+    return fmt in EXTENSIONS
+
+def load_codecs(config_file=CONFIG_FILE):
+    """The "codecs" block of config.json: stage directory name -> {"format", "level"}"""
+    try:
+        with open(config_file, "r") as f:
+            return json.load(f).get("codecs", {})
+    except (OSError, ValueError):
+        return {}
+
+def stage_codec(stage, codecs=None):
+    """(format, level) a stage writes its frames with; resolve once per run, not per frame"""
+    codecs = load_codecs() if codecs is None else codecs
+    settings = {**DEFAULT_CODEC, **codecs.get("default", {}), **codecs.get(stage, {})}
+    if settings["format"] not in EXTENSIONS:
+        raise ValueError(f"Unknown codec '{settings['format']}' for stage '{stage}' (choose from {', '.join(FORMATS)})")
+    if not available(settings["format"]):
+        print(f"{settings['format'].upper()} is not available for '{stage}' in this environment; writing uncompressed TIFF")
+        settings["format"], settings["level"] = "tiff", None
+    return settings["format"], settings["level"]
+
+def frame_name(frame_file, fmt):
+    """Name of a frame's output in a stage that writes `fmt`"""
+    return os.path.splitext(frame_file)[0] + EXTENSIONS[fmt]
+
+@contextmanager
+def _quiet_tiff(fmt):
+    """Hide libtiff's warning on every BGRA TIFF OpenCV itself wrote (alpha is an unnamed extra sample)"""
+    if fmt != "tiff":
+        yield
+        return
+    previous = cv2.utils.logging.getLogLevel()
+    cv2.utils.logging.setLogLevel(cv2.utils.logging.LOG_LEVEL_ERROR)
+    try:
+        yield
+    finally:
+        cv2.utils.logging.setLogLevel(previous)
+
+def encode(image, fmt="png", level=None):
+    """Encode an image to bytes; `level` is the PNG zlib level (0-9) or EXR compression"""
+    if fmt == "png":
+        params = [] if level is None else [cv2.IMWRITE_PNG_COMPRESSION, int(level)]
+        return cv2.imencode(".png", image, params)[1].tobytes()
+    if fmt == "tiff":
+        with _quiet_tiff(fmt):
+            return cv2.imencode(".tiff", image, [cv2.IMWRITE_TIFF_COMPRESSION, 1])[1].tobytes()  # 1 = none
+    if fmt == "npy":
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(image), allow_pickle=False)
+        return buffer.getvalue()
+    if fmt == "qoi":
+        if qoi is None:
+            raise RuntimeError("QOI needs the optional 'qoi' package (pip install qoi)")
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)  # QOI has no single-channel mode
+        elif image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2RGBA)
+        else:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        return qoi.encode(np.ascontiguousarray(image))
+    if fmt == "exr":
+        if image.dtype == np.uint8:
+            image = image.astype(np.float32) / 255.0
+        if not cv2.haveImageWriter(".exr"):
+            return _encode_exr_openexr(image, EXR_COMPRESSION["zip"] if level is None else int(level))
+        params = [cv2.IMWRITE_EXR_TYPE, cv2.IMWRITE_EXR_TYPE_HALF]
+        if level is not None:
+            params += [cv2.IMWRITE_EXR_COMPRESSION, int(level)]
+        return cv2.imencode(".exr", image.astype(np.float32), params)[1].tobytes()
+    raise ValueError(f"Unknown codec '{fmt}'")
+
+def _apply_flags(image, flags):
+    """Give a raw decoded array the channel layout and depth cv2.imread would return for `flags`"""
+    if flags == cv2.IMREAD_UNCHANGED:
+        return image
+    if image.dtype != np.uint8 and not flags & cv2.IMREAD_ANYDEPTH:
+        scale = 255.0 if image.dtype.kind == "f" else 255.0 / np.iinfo(image.dtype).max
+        image = np.clip(image * scale, 0, 255).astype(np.uint8)
+    if not flags & cv2.IMREAD_COLOR:
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+    elif image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    elif image.shape[2] == 4:
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+    return image
+
+def decode(data, fmt, flags=cv2.IMREAD_UNCHANGED):
+    """Decode bytes written by encode(); `flags` behaves like cv2.imread flags"""
+    if fmt == "npy":
+        return _apply_flags(np.load(io.BytesIO(data), allow_pickle=False), flags)
+    if fmt == "qoi":
+        if qoi is None:
+            raise RuntimeError("QOI needs the optional 'qoi' package (pip install qoi)")
+        image = qoi.decode(data)
+        image = cv2.cvtColor(image, cv2.COLOR_RGBA2BGRA if image.shape[2] == 4 else cv2.COLOR_RGB2BGR)
+        return _apply_flags(image, flags)
+    if fmt == "exr":
+        if not cv2.haveImageWriter(".exr") and OpenEXR is not None:
+            return _apply_flags(_decode_exr_openexr(data), flags)
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+        return None if image is None else _apply_flags(image, flags)
+    with _quiet_tiff(fmt):
+        return cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+
+def format_of(path):
+    ext = os.path.splitext(path)[1].lower()
+    return {".tif": "tiff", ".jpg": "jpeg", ".jpeg": "jpeg"}.get(ext, ext.lstrip("."))
+
+def read_image(path, flags=cv2.IMREAD_UNCHANGED):
+    """cv2.imread that also understands the NPY, QOI and half-float EXR intermediates; None if unreadable"""
+    fmt = format_of(path)
+    if fmt not in ("npy", "qoi", "exr"):
+        with _quiet_tiff(fmt):
+            return cv2.imread(path, flags)
+    try:
+        if fmt == "npy":
+            return _apply_flags(np.load(path, allow_pickle=False), flags)
+        if fmt == "exr" and not cv2.haveImageReader(path) and OpenEXR is not None:
+            return _apply_flags(_read_exr_openexr(path), flags)
+        with open(path, "rb") as f:
+            return decode(f.read(), fmt, flags)
+    except (OSError, ValueError, RuntimeError):
+        return None
+
+def _read_exr_openexr(path):
+    """Read a gray/BGR/BGRA EXR as float32 with the OpenEXR bindings"""
+    exr = OpenEXR.InputFile(path)
+    try:
+        header = exr.header()
+        window = header["dataWindow"]
+        width, height = window.max.x - window.min.x + 1, window.max.y - window.min.y + 1
+        names = [name for name in "BGRA" if name in header["channels"]] or list(header["channels"])[:1]
+        as_float = Imath.PixelType(Imath.PixelType.FLOAT)
+        planes = [np.frombuffer(exr.channel(name, as_float), np.float32).reshape(height, width) for name in names]
+    finally:
+        exr.close()
+    return planes[0].copy() if len(planes) == 1 else np.dstack(planes)
+
+def _write_exr_openexr(path, image, compression):
+    """Write a half-float EXR with the OpenEXR bindings; float16 input is written without conversion"""
+    height, width = image.shape[:2]
+    half = Imath.PixelType(Imath.PixelType.HALF)
+    if image.ndim == 2:
+        planes = {"Y": image}
+    else:
+        names = "BGRA" if image.shape[2] == 4 else "BGR"
+        planes = {name: image[:, :, i] for i, name in enumerate(names)}
+    header = OpenEXR.Header(width, height)
+    header["channels"] = {name: Imath.Channel(half) for name in planes}
+    header["compression"] = Imath.Compression(compression)
+    output = OpenEXR.OutputFile(path, header)
+    try:
+        output.writePixels({name: np.ascontiguousarray(plane, np.float16).tobytes() for name, plane in planes.items()})
+    finally:
+        output.close()
+
+def _encode_exr_openexr(image, compression):
+    """EXR bytes through the OpenEXR bindings, which only write files: round-trip a temporary file"""
+    if OpenEXR is None:
+        raise RuntimeError("Writing EXR needs OpenCV with OpenEXR enabled or the OpenEXR package (pip install OpenEXR)")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "frame.exr")
+        _write_exr_openexr(path, image, compression)
+        with open(path, "rb") as f:
+            return f.read()
+
+def _decode_exr_openexr(data):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "frame.exr")
+        with open(path, "wb") as f:
+            f.write(data)
+        return _read_exr_openexr(path)
+
+def write_exr(path, image, compression="zip"):
+    """Write a half-float EXR (gray, BGR or BGRA; uint8 is scaled to 0-1); returns the written bytes"""
+    if image.dtype == np.uint8:
+        image = image.astype(np.float32) / 255.0
+    level = EXR_COMPRESSION[compression] if isinstance(compression, str) else compression
+    if cv2.haveImageWriter(".exr"):
+        params = [cv2.IMWRITE_EXR_TYPE, cv2.IMWRITE_EXR_TYPE_HALF, cv2.IMWRITE_EXR_COMPRESSION, int(level)]
+        data = cv2.imencode(".exr", image.astype(np.float32, copy=False), params)[1].tobytes()
+        with open(path, "wb") as f:
+            f.write(data)
+        return data
+    if OpenEXR is None:
+        raise RuntimeError("Writing EXR needs OpenCV with OpenEXR enabled or the OpenEXR package (pip install OpenEXR)")
+    _write_exr_openexr(path, image, int(level))
+    with open(path, "rb") as f:
+        return f.read()  # Read back so callers can write debug copies and hash it like any other frame
+
+def write_image(path, image, fmt=None, level=None):
+    """Encode and write a frame, returning the written bytes (for the shot manifest hash)"""
+    fmt = fmt or format_of(path)
+    if fmt == "exr":
+        return write_exr(path, image, 3 if level is None else level)
+    data = encode(image, fmt, level)
+    with open(path, "wb") as f:
+        f.write(data)
+    return data
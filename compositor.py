@@ -0,0 +1,258 @@
+import os
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from tqdm import tqdm
+from runtime_config import apply_runtime_config, stage_setting
+from progress_events import StageReporter
+from shot_manifest import list_frames, open_manifest
+from deduplicate_frames import frame_stem
+from codecs_io import READ_EXTENSIONS, stage_codec, frame_name, read_image, write_image
+from memory_governor import MemoryGovernor
+
+OUTPUT_ROOT = "output"
+FRAMES_DIR = os.path.join(OUTPUT_ROOT, "original_frames")
+MATTE_STAGE = "refined_masks"
+OUTPUT_DIR = os.path.join(OUTPUT_ROOT, "composites")
+
+# The global batch_size/workers are tuned for SegFormer and the OpenCV process pool, so only
+# a "stages": {"composite": {...}} override applies here
+BATCH_SIZE = stage_setting("batch_size", 8, "composite")
+WORKERS = stage_setting("workers", min(4, os.cpu_count() or 1), "composite")
+LIGHT_WRAP_RADIUS = 15   # Blur radius of the background light that spills over the edges
+BENCHMARK_SIZES = {"1080p": (1920, 1080), "4K": (3840, 2160)}
+
+class Backgrounds:
+    """A still plate, or a plate sequence that is looped to the length of the shot"""
+
+    def __init__(self, source, size):
+        self.size = size
+        if os.path.isdir(source):
+            self.plates = [os.path.join(source, name) for name in sorted(os.listdir(source))
+                           if name.lower().endswith(READ_EXTENSIONS)]
+        else:
+            self.plates = [source]
+        if not self.plates:
+            raise RuntimeError(f"No background plates in {source}")
+        self.cache = {}
+
+    @property
+    def is_still(self):
+        return len(self.plates) == 1
+
+    def plate(self, index):
+        path = self.plates[index % len(self.plates)]
+        if path in self.cache:
+            return self.cache[path]
+        image = read_image(path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise RuntimeError(f"Could not read background {path}")
+        if image.shape[1::-1] != self.size:
+            image = cv2.resize(image, self.size, interpolation=cv2.INTER_AREA)
+        if self.is_still:
+            self.cache[path] = image  # A still is decoded once for the whole shot
+        return image
+
+    def batch(self, start, count):
+        """(count, H, W, 3) plates, or a single (H, W, 3) still that broadcasts over the batch"""
+        if self.is_still:
+            return self.plate(0)
+        return np.stack([self.plate(start + i) for i in range(count)])
+
+def soften_edges(alpha, radius):
+    """Gaussian-blur each matte of a (N, H, W) batch in place; only the edges actually change"""
+    ksize = 2 * radius + 1
+    for matte in alpha:
+        cv2.GaussianBlur(matte, (ksize, ksize), 0, dst=matte)
+    return alpha
+
+def div255(x):
+    """Exact round(x / 255) for uint16 x <= 255 * 255, in place and without leaving uint16"""
+    x += 128
+    x += x >> 8
+    x >>= 8
+    return x
+
+class Compositor:
+    """Premultiplied alpha-over of (N, H, W, 3) uint8 batches in fixed-point uint16.
+
+    The uint16 working buffers are allocated once per batch shape and reused,
+    so a long shot composites without per-frame allocations.
+    """
+
+    def __init__(self, light_wrap=0.0, edge_blur=0):
+        if not 0.0 <= light_wrap <= 1.0:
+            raise ValueError("light_wrap must be between 0 and 1")  # Larger weights overflow uint16
+        self.light_wrap = light_wrap
+        self.edge_blur = edge_blur
+        self.buffers = None
+        self.wrap_cache = None
+
+    def _buffers(self, shape):
+        if self.buffers is None or self.buffers[0].shape != shape:
+            self.buffers = (np.empty(shape, np.uint16), np.empty(shape, np.uint16), np.empty(shape[:3] + (1,), np.uint16))
+        return self.buffers
+
+    def over(self, fg, alpha, bg):
+        """fg (N,H,W,3) uint8, alpha (N,H,W) uint8, bg (N,H,W,3) or (H,W,3) uint8 -> (N,H,W,3) uint8"""
+        if self.edge_blur:
+            alpha = soften_edges(alpha.copy(), self.edge_blur)
+        out, scratch, a = self._buffers(fg.shape)
+        a[..., 0] = alpha
+
+        # Premultiply the foreground, then add the background weighted by 255 - alpha
+        np.multiply(fg, a, out=out)
+        np.subtract(255, a, out=a)
+        np.multiply(bg, a, out=scratch)
+        out += scratch
+        div255(out)
+
+        if self.light_wrap:
+            self._light_wrap(out, alpha, bg, scratch, a)
+        return out.astype(np.uint8)
+
+    def _light_wrap(self, out, alpha, bg, scratch, weight):
+        """Blend blurred background light over the inside of the matte edge"""
+        ksize = (2 * LIGHT_WRAP_RADIUS + 1,) * 2
+        if bg.ndim == 3:
+            # A still plate's blur is computed once for the shot
+            if self.wrap_cache is None or self.wrap_cache[0] is not bg:
+                self.wrap_cache = (bg, cv2.blur(bg, ksize))
+            blurred = self.wrap_cache[1]
+        else:
+            blurred = np.stack([cv2.blur(plate, ksize) for plate in bg])
+
+        # weight = alpha * (255 - blur(alpha)) / 255 * strength: high just inside the edge, 0 elsewhere
+        for i, matte in enumerate(alpha):
+            weight[i, :, :, 0] = 255 - cv2.blur(matte, ksize)
+        weight *= alpha[..., None]
+        div255(weight)
+        weight *= int(round(self.light_wrap * 256))
+        weight >>= 8
+
+        np.multiply(blurred, weight, out=scratch)
+        np.subtract(255, weight, out=weight)
+        out *= weight
+        out += scratch
+        div255(out)
+
+def load_inputs(frame_path, matte_path):
+    frame = cv2.imread(frame_path, cv2.IMREAD_COLOR)
+    matte = read_image(matte_path, cv2.IMREAD_GRAYSCALE) if matte_path else None
+    if frame is not None and matte is not None and matte.shape != frame.shape[:2]:
+        matte = cv2.resize(matte, (frame.shape[1], frame.shape[0]), interpolation=cv2.INTER_LINEAR)
+    return frame, matte
+
+def composite_shot(background, matte_stage=MATTE_STAGE, light_wrap=0.0, edge_blur=0):
+    """Composite every frame over the background, decoding and writing on a thread pool"""
+    manifest = open_manifest(OUTPUT_ROOT)
+    frame_files = list_frames(FRAMES_DIR)
+    if not frame_files:
+        print("No frames found in input directory!")
+        return
+    mattes = manifest.frames_by_stem(matte_stage)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    stage = os.path.basename(OUTPUT_DIR)
+    fmt, level = stage_codec(stage)
+
+    first = cv2.imread(os.path.join(FRAMES_DIR, frame_files[0]), cv2.IMREAD_COLOR)
+    backgrounds = Backgrounds(background, (first.shape[1], first.shape[0]))
+    compositor = Compositor(light_wrap, edge_blur)
+    reporter = StageReporter("composite", len(frame_files))
+    governor = MemoryGovernor("composite")
+    governor.knob("batch_size", BATCH_SIZE)
+    pending = deque()
+
+    def finish_writes(limit):
+        while len(pending) > limit:
+            output_file, future = pending.popleft()
+            manifest.record(stage, output_file, future.result())
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor, \
+            tqdm(total=len(frame_files), desc="Compositing") as progress:
+        index = 0
+        while index < len(frame_files):
+            batch_files = frame_files[index:index + governor["batch_size"]]
+            start = time.perf_counter()
+            matte_paths = [os.path.join(OUTPUT_ROOT, matte_stage, mattes[frame_stem(f)]) if frame_stem(f) in mattes else None
+                           for f in batch_files]
+            inputs = list(executor.map(load_inputs, [os.path.join(FRAMES_DIR, f) for f in batch_files], matte_paths))
+            missing = [f for f, (frame, matte) in zip(batch_files, inputs) if frame is None or matte is None]
+            if missing:
+                print(f"Missing frame or matte for {', '.join(missing)}; skipping")
+
+            # Frames without a matte keep their slot so plates stay in step with the shot
+            keep = [i for i, (frame, matte) in enumerate(inputs) if frame is not None and matte is not None]
+            if keep:
+                fg = np.stack([inputs[i][0] for i in keep])
+                alpha = np.stack([inputs[i][1] for i in keep])
+                bg = backgrounds.batch(index, len(batch_files))
+                if bg.ndim == 4:
+                    bg = bg[keep]
+                composites = compositor.over(fg, alpha, bg)
+                for i, image in zip(keep, composites):
+                    output_file = frame_name(batch_files[i], fmt)
+                    pending.append((output_file, executor.submit(write_image, os.path.join(OUTPUT_DIR, output_file), image, fmt, level)))
+
+            finish_writes(2 * len(batch_files))
+            governor.check()
+            reporter.frame_done(batch_files[0], time.perf_counter() - start, frames=len(batch_files))
+            progress.update(len(batch_files))
+            index += len(batch_files)
+        finish_writes(0)
+
+    manifest.flush()
+    reporter.finish()
+
+def benchmark(batch_size, repeats, light_wrap, edge_blur):
+    """Per-frame compositing cost at 1080p and 4K, on the example frames when available"""
+    from benchmark import load_example_frames, synthetic_frame
+
+    print(f"{'size':>6} {'mode':<22} {'ms/frame':>10} {'fps':>8}")
+    modes = [("alpha-over", 0.0, 0), ("+ edge blur", 0.0, edge_blur), ("+ light wrap", light_wrap, 0),
+             ("+ edge blur + wrap", light_wrap, edge_blur)]
+    for label, (width, height) in BENCHMARK_SIZES.items():
+        pairs = load_example_frames(width, height)
+        if not pairs:
+            frame = synthetic_frame(0, width, height)
+            pairs = [(frame, (cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) < 128).astype(np.uint8) * 255)]
+        fg = np.stack([pairs[i % len(pairs)][0] for i in range(batch_size)])
+        alpha = np.stack([pairs[i % len(pairs)][1] for i in range(batch_size)])
+        bg = np.ascontiguousarray(np.flip(pairs[0][0], axis=1))  # A plate of the same size
+
+        for mode, wrap, blur in modes:
+            compositor = Compositor(wrap, blur)
+            compositor.over(fg, alpha, bg)  # Warm-up allocates the buffers
+            start = time.perf_counter()
+            for _ in range(repeats):
+                compositor.over(fg, alpha, bg)
+            ms = 1000.0 * (time.perf_counter() - start) / (repeats * batch_size)
+            print(f"{label:>6} {mode:<22} {ms:10.2f} {1000.0 / ms:8.1f}")
+
+def main():
+    apply_runtime_config("composite")
+    parser = argparse.ArgumentParser(description="Composite the cutouts over a new background plate")
+    parser.add_argument("--background", help="Still image or a directory holding a plate sequence")
+    parser.add_argument("--matte", default=MATTE_STAGE, help="Stage directory under output/ holding the mattes")
+    parser.add_argument("--light-wrap", type=float, default=0.0, help="Strength (0-1) of background light wrapping the edges")
+    parser.add_argument("--edge-blur", type=int, default=0, help="Gaussian radius (pixels) used to soften the matte")
+    parser.add_argument("--benchmark", action="store_true", help="Print the per-frame cost at 1080p and 4K and exit")
+    parser.add_argument("--batch", type=int, default=4, help="Frames per batch in --benchmark")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed batches per mode in --benchmark")
+    args = parser.parse_args()
+
+    if not 0.0 <= args.light_wrap <= 1.0:
+        parser.error("--light-wrap must be between 0 and 1")
+
+    if args.benchmark:
+        benchmark(args.batch, args.repeats, args.light_wrap or 0.5, args.edge_blur or 2)
+        return
+    if not args.background:
+        parser.error("--background is required")
+    composite_shot(args.background, args.matte, args.light_wrap, args.edge_blur)
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,17 @@ import os
 import cv2
 import torch
 import numpy as np
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from transformers import SegformerImageProcessor, SegformerForSemanticSegmentation
+from runtime_config import apply_runtime_config, get_setting
+from progress_events import StageReporter
+from shot_manifest import list_frames, open_manifest
+from codecs_io import EXR_COMPRESSION, available, write_exr
+from memory_governor import MemoryGovernor
 
 # Enable CUDA optimizations
 torch.backends.cuda.matmul.allow_tf32 = True
@@ -20,53 +29,114 @@ INPUT_DIR = "output/final_transparent"
 OUTPUT_DIR = "output/segformer_final"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-BATCH_SIZE = 4  # Adjust based on available VRAM
+BATCH_SIZE = get_setting("batch_size", 4, "convert_exr")  # Tuned by autotune.py; adjust based on available VRAM
+WRITERS = stage_setting("workers", min(4, os.cpu_count() or 1), "convert_exr")  # EXR encode threads
+CHANNELS = ["single", "rgba"]
 
-def process_batch(image_paths, output_paths):
+def predict_mattes(images):
+    """Half-float max-probability mattes at each frame's resolution, straight from the batched logits"""
+    # Run SegFormer with proper amp context
+    with torch.cuda.amp.autocast(dtype=torch.float16):
+        inputs = processor(images=images, return_tensors="pt").to(device)
+        with torch.no_grad():
+            logits = model(**inputs).logits
+
+    # Get probability masks; stay in float and upsample on the device, never through 8 bits
+    probs = torch.nn.functional.softmax(logits.float(), dim=1)
+    refined = probs.max(dim=1, keepdim=True).values
+    mattes = []
+    for matte, image in zip(refined, images):
+        matte = torch.nn.functional.interpolate(matte[None], size=image.shape[:2], mode="bilinear", align_corners=False)
+        mattes.append(matte[0, 0].clamp_(0, 1).half().cpu().numpy())
+    return mattes
+
+def matte_image(matte, image_rgb, channels):
+    """Single-channel matte, or BGRA with the frame as color (0-1) and the matte as alpha"""
+    if channels == "single":
+        return matte
+    rgba = np.empty(matte.shape + (4,), np.float16)
+    rgba[:, :, :3] = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR) / np.float16(255)
+    rgba[:, :, 3] = matte
+    return rgba
+
+def process_batch(image_paths, output_paths, executor, channels="single", compression="zip"):
+    """Predict a batch and queue its EXR writes; returns (output path, future) per queued frame"""
     try:
         images = []
-        for path in image_paths:
+        paths = []
+        for path, output_path in zip(image_paths, output_paths):
             img = cv2.imread(path, cv2.IMREAD_COLOR)
             if img is None:
                 print(f"Failed to read image: {path}")
                 continue
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            images.append(img_rgb)
+            images.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+            paths.append(output_path)
 
         if not images:
-            return False
-
-        # Run SegFormer with proper amp context
-        with torch.cuda.amp.autocast(dtype=torch.float16):
-            inputs = processor(images=images, return_tensors="pt").to(device)
-            with torch.no_grad():
-                logits = model(**inputs).logits
+            return []
 
-        # Get probability masks
-        probs = torch.nn.functional.softmax(logits, dim=1)
-        refined_masks = probs.max(dim=1).values
-        refined_masks = [(mask.cpu().numpy() * 255).astype(np.uint8) for mask in refined_masks]
-
-        # Save Final Refinement Masks
-        for refined_mask, output_path in zip(refined_masks, output_paths):
-            cv2.imwrite(output_path, refined_mask)
-
-        return True
+        # Save Final Refinement Mattes on the writer pool while the next batch runs
+        mattes = predict_mattes(images)
+        return [(output_path, executor.submit(write_exr, output_path, matte_image(matte, image, channels), compression))
+                for matte, image, output_path in zip(mattes, images, paths)]
 
     except Exception as e:
         print(f"Error in batch processing: {str(e)}")
-        return False
+        return []
 
 def main():
-    frame_files = sorted([f for f in os.listdir(INPUT_DIR) if f.endswith(".png")])
-    
-    # Process in Batches
-    for i in tqdm(range(0, len(frame_files), BATCH_SIZE), desc="Final SegFormer Pass"):
-        batch_files = frame_files[i:i + BATCH_SIZE]
-        batch_paths = [os.path.join(INPUT_DIR, f) for f in batch_files]
-        output_paths = [os.path.join(OUTPUT_DIR, f) for f in batch_files]
-
-        process_batch(batch_paths, output_paths)
+    apply_runtime_config("convert_exr")
+    parser = argparse.ArgumentParser(description="Final SegFormer pass writing half-float EXR mattes")
+    parser.add_argument("--channels", choices=CHANNELS, default="single",
+                        help="single: one Y channel matte; rgba: frame color with the matte as alpha")
+    parser.add_argument("--compression", choices=list(EXR_COMPRESSION), default="zip")
+    parser.add_argument("--writers", type=int, default=WRITERS, help="Threads encoding and writing EXR files")
+    args = parser.parse_args()
+
+    if not available("exr"):
+        print("EXR output needs OpenCV built with OpenEXR or the OpenEXR package (pip install OpenEXR)")
+        return
+
+    frame_files = list_frames(INPUT_DIR)
+    reporter = StageReporter("convert_exr", len(frame_files))
+    manifest = open_manifest()
+    stage = os.path.basename(OUTPUT_DIR)
+    pending = deque()
+
+    # Batch size and frames queued for the writers shrink when RSS nears the memory budget
+    governor = MemoryGovernor("convert_exr")
+    governor.knob("batch_size", BATCH_SIZE)
+    governor.knob("pending_writes", 2 * BATCH_SIZE)
+
+    def finish_writes(limit):
+        # Bound the frames waiting for the writers so decoded mattes don't pile up
+        while len(pending) > limit:
+            output_path, future = pending.popleft()
+            try:
+                manifest.record(stage, os.path.basename(output_path), future.result())
+            except Exception as e:
+                print(f"Failed to write {output_path}: {e}")
+
+    with ThreadPoolExecutor(max_workers=args.writers) as executor, \
+            tqdm(total=len(frame_files), desc="Final SegFormer Pass") as progress:
+        # Process in Batches
+        i = 0
+        while i < len(frame_files):
+            batch_files = frame_files[i:i + governor["batch_size"]]
+            i += len(batch_files)
+            batch_paths = [os.path.join(INPUT_DIR, f) for f in batch_files]
+            output_paths = [os.path.join(OUTPUT_DIR, os.path.splitext(f)[0] + ".exr") for f in batch_files]
+
+            start = time.perf_counter()
+            pending.extend(process_batch(batch_paths, output_paths, executor, args.channels, args.compression))
+            finish_writes(governor["pending_writes"])
+            governor.check()
+            reporter.frame_done(batch_files[0], time.perf_counter() - start, frames=len(batch_files))
+            progress.update(len(batch_files))
+        finish_writes(0)
+
+    manifest.flush()
+    reporter.finish()
 
 if __name__ == "__main__":
     main()
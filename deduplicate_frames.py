@@ -0,0 +1,168 @@
+import os
+import json
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from tqdm import tqdm
+from runtime_config import apply_runtime_config, stage_setting
+from shot_manifest import list_frames
+from memory_governor import MemoryGovernor
+
+OUTPUT_DIR = "output"
+INPUT_DIR = os.path.join(OUTPUT_DIR, "original_frames")
+DEDUP_MAP = os.path.join(OUTPUT_DIR, "dedup_map.json")
+
+HASH_DISTANCE = 4       # Max differing dHash bits before frames are considered different
+PIXEL_TOLERANCE = 8     # Per-pixel difference treated as encoding noise
+CHANGED_FRACTION = 0.001  # Max fraction of pixels allowed above the noise tolerance
+WORKERS = stage_setting("workers", min(8, os.cpu_count() or 1), "deduplicate")  # Decode threads
+PREFETCH = 2 * WORKERS  # Decoded frames held in memory ahead of the comparison
+
+def dhash(gray):
+    """64-bit difference hash of a grayscale image"""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+def load_frame(path):
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None, None
+    gray = image if image.ndim == 2 else cv2.cvtColor(image[:, :, :3], cv2.COLOR_BGR2GRAY)
+    return image, dhash(gray)
+
+def prefetch(executor, fn, items, depth=PREFETCH, governor=None):
+    """Like executor.map, but never more than `depth` results ahead of the consumer.
+
+    With a governor, its "prefetch" knob replaces `depth`, so the look-ahead
+    (and the number of busy workers) shrinks when memory runs short.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        while len(pending) >= (governor["prefetch"] if governor else depth):
+            if governor:
+                governor.check()
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def is_duplicate(image, image_hash, reference, reference_hash):
+    """True if two frames are identical or differ only by encoding noise"""
+    if bin(image_hash ^ reference_hash).count("1") > HASH_DISTANCE:
+        return False
+    if image.shape != reference.shape or image.dtype != reference.dtype:
+        return False
+    diff = cv2.absdiff(image, reference)
+    if not diff.any():
+        return True
+    if image.dtype == np.uint16:
+        diff = diff >> 8
+    changed = np.count_nonzero(diff > PIXEL_TOLERANCE)
+    return changed <= CHANGED_FRACTION * diff.size
+
+def file_signature(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def find_duplicates(input_dir=INPUT_DIR):
+    """Map every held/repeated frame to the first frame of its run"""
+    frame_files = list_frames(input_dir)
+    duplicates = {}
+    reference = reference_hash = reference_file = None
+
+    # Decode ahead on a thread pool; comparisons stay in frame order
+    governor = MemoryGovernor("deduplicate")
+    governor.knob("prefetch", PREFETCH)
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        frames = prefetch(executor, load_frame, [os.path.join(input_dir, f) for f in frame_files], governor=governor)
+        for frame_file, (image, image_hash) in tqdm(zip(frame_files, frames), total=len(frame_files), desc="Finding duplicates"):
+            if image is None:
+                print(f"Failed to load {frame_file}")
+                continue
+            if reference is not None and is_duplicate(image, image_hash, reference, reference_hash):
+                duplicates[frame_file] = reference_file
+            else:
+                # Compare against the group's first frame so slow drift never chains into one group
+                reference, reference_hash, reference_file = image, image_hash, frame_file
+
+    return frame_files, duplicates
+
+def save_duplicates(duplicates, input_dir=INPUT_DIR, map_file=DEDUP_MAP):
+    """Store the duplicate map with file signatures so a stale map is never applied"""
+    names = set(duplicates) | set(duplicates.values())
+    data = {
+        "source": input_dir,
+        "duplicates": duplicates,
+        "signatures": {name: file_signature(os.path.join(input_dir, name)) for name in names},
+    }
+    with open(map_file, "w") as f:
+        json.dump(data, f, indent=1)
+
+def load_duplicates(map_file=DEDUP_MAP):
+    """Duplicate -> representative frame names, or {} if no valid map exists"""
+    if not os.path.exists(map_file):
+        return {}
+    try:
+        with open(map_file, "r") as f:
+            data = json.load(f)
+        for name, signature in data["signatures"].items():
+            if file_signature(os.path.join(data["source"], name)) != signature:
+                print(f"Frames changed since {map_file} was written; processing all frames")
+                return {}
+        return data["duplicates"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+def frame_stem(frame_file):
+    """Frame name without extension; stages writing different codecs share it"""
+    return os.path.splitext(frame_file)[0]
+
+def output_name(frame_file, ext=None):
+    """Output file name for a frame, optionally with a different extension"""
+    return frame_file if ext is None else os.path.splitext(frame_file)[0] + ext
+
+def skip_duplicates(frame_files, stage_dir, ext=None):
+    """Frames a stage still has to process, plus the duplicate map to fan out afterwards"""
+    duplicates = load_duplicates()
+    duplicate_stems = {frame_stem(name) for name in duplicates}
+    frame_files = [f for f in frame_files if frame_stem(f) not in duplicate_stems]
+    unlink_fanned_out(frame_files, stage_dir, ext)
+    return frame_files, duplicates
+
+def unlink_fanned_out(frame_files, stage_dir, ext=None):
+    """Remove the outputs of `frame_files` that an earlier fan-out hardlinked, so they aren't overwritten in place"""
+    pending = {output_name(f, ext) for f in frame_files}
+    if os.path.isdir(stage_dir):
+        for entry in os.scandir(stage_dir):
+            if entry.name in pending and os.stat(entry.path).st_nlink > 1:
+                os.unlink(entry.path)
+
+def fan_out(stage_dir, duplicates, ext=None):
+    """Give every duplicate frame the representative's output, as a hardlink where possible"""
+    linked = 0
+    for duplicate, representative in duplicates.items():
+        source = os.path.join(stage_dir, output_name(representative, ext))
+        target = os.path.join(stage_dir, output_name(duplicate, ext))
+        if not os.path.exists(source):
+            continue
+        if os.path.lexists(target):
+            os.unlink(target)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)  # Filesystem without hardlink support
+        linked += 1
+    return linked
+
+def main():
+    apply_runtime_config("deduplicate")
+    frame_files, duplicates = find_duplicates()
+    save_duplicates(duplicates)
+    groups = len(frame_files) - len(duplicates)
+    print(f" {len(duplicates)} of {len(frame_files)} frames are duplicates; {groups} unique frames will be processed")
+
+if __name__ == "__main__":
+    main()
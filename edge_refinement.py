@@ -2,6 +2,12 @@ import os
 import cv2
 import numpy as np
 from tqdm import tqdm
+from runtime_config import apply_runtime_config
+from progress_events import track
+from deduplicate_frames import skip_duplicates, fan_out, frame_stem
+from empty_frames import load_empty_frames, write_empty_frame, image_size
+from shot_manifest import open_manifest
+from codecs_io import EXTENSIONS, READ_EXTENSIONS, stage_codec, frame_name, read_image, write_image
 
 INPUT_DIR = "output/cutouts"
 OUTPUT_DIR = "output/final_cutouts"
@@ -26,16 +32,17 @@ def refine_edges(image):
     kernel = np.ones((3,3), np.uint8)
     dilated_edges = cv2.dilate(combined_edges, kernel, iterations=1)
     
-    # Create mask for edge feathering
-    feather_mask = cv2.GaussianBlur(dilated_edges.astype(float), (5,5), 0)
-    feather_mask = feather_mask / feather_mask.max()
+    # Create mask for edge feathering (float32, updated in place: float64 temporaries cost 8 bytes a pixel)
+    feather_mask = cv2.GaussianBlur(dilated_edges.astype(np.float32), (5,5), 0)
+    peak = feather_mask.max()
+    if peak > 0:
+        feather_mask *= 1.0 / peak
     
-    # Apply feathering to alpha channel
-    refined_alpha = cv2.addWeighted(
-        alpha.astype(float), 1.0,
-        feather_mask * alpha.astype(float), -0.3,
-        0
-    ).clip(0, 255).astype(np.uint8)
+    # Apply feathering to alpha channel: alpha - 0.3 * feather * alpha
+    feather_mask *= -0.3
+    feather_mask += 1.0
+    feather_mask *= alpha
+    refined_alpha = feather_mask.clip(0, 255, out=feather_mask).astype(np.uint8)
     
     # Reconstruct image
     refined_image = image.copy()
@@ -43,25 +50,40 @@ def refine_edges(image):
     
     return refined_image
 
-def process_frame(input_path, output_path):
-    """Process a single frame"""
-    image = cv2.imread(input_path, cv2.IMREAD_UNCHANGED)
-    if image is None or image.shape[2] != 4:  # Ensure RGBA
+def process_frame(input_path, output_path, level=None):
+    """Process a single frame; returns the written bytes, or None on failure"""
+    image = read_image(input_path, cv2.IMREAD_UNCHANGED)
+    if image is None or image.ndim != 3 or image.shape[2] != 4:  # Ensure RGBA
         print(f"Error: {input_path} is not a valid RGBA image")
-        return False
+        return None
         
     refined = refine_edges(image)
-    cv2.imwrite(output_path, refined)
-    return True
+    return write_image(output_path, refined, level=level)
 
 def main():
     """Process all cutouts"""
-    frame_files = sorted([f for f in os.listdir(INPUT_DIR) if f.endswith('.png')])
+    apply_runtime_config("edge_refinement")
+    manifest = open_manifest()
+    frame_files = manifest.frames("cutouts", READ_EXTENSIONS)
     
-    for frame_file in tqdm(frame_files, desc="Refining edges"):
+    fmt, level = stage_codec("final_cutouts")
+    frame_files, duplicates = skip_duplicates(frame_files, OUTPUT_DIR, EXTENSIONS[fmt])
+    empty_frames = load_empty_frames()
+
+    for frame_file in tqdm(track("edge_refinement", frame_files), total=len(frame_files), desc="Refining edges"):
         input_path = os.path.join(INPUT_DIR, frame_file)
-        output_path = os.path.join(OUTPUT_DIR, frame_file)
-        process_frame(input_path, output_path)
+        output_file = frame_name(frame_file, fmt)
+        output_path = os.path.join(OUTPUT_DIR, output_file)
+        if frame_stem(frame_file) in empty_frames:
+            data = write_empty_frame(output_path, image_size(input_path) + (4,), level)
+        else:
+            data = process_frame(input_path, output_path, level)
+        if data is not None:
+            manifest.record("final_cutouts", output_file, data)
+
+    fan_out(OUTPUT_DIR, duplicates, EXTENSIONS[fmt])
+    manifest.sync("final_cutouts")
+    manifest.hash_missing("final_cutouts")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,59 @@
+import os
+import json
+import struct
+import cv2
+import numpy as np
+from deduplicate_frames import file_signature, frame_stem
+from codecs_io import encode, format_of, read_image
+
+# Frames person_prefilter.py found no one in; later stages write constant output for them
+EMPTY_FRAMES_FILE = os.path.join("output", "empty_frames.json")
+
+def save_empty_frames(empty, input_dir, empty_file=EMPTY_FRAMES_FILE):
+    """Record the empty frames with file signatures so a stale list is never applied"""
+    data = {
+        "source": input_dir,
+        "signatures": {name: file_signature(os.path.join(input_dir, name)) for name in empty},
+    }
+    with open(empty_file, "w") as f:
+        json.dump(data, f, indent=1)
+
+def load_empty_frames(empty_file=EMPTY_FRAMES_FILE):
+    """Name stems (no extension) of the frames marked empty, or an empty set if the list is missing or stale"""
+    if not os.path.exists(empty_file):
+        return set()
+    try:
+        with open(empty_file, "r") as f:
+            data = json.load(f)
+        for name, signature in data["signatures"].items():
+            if file_signature(os.path.join(data["source"], name)) != signature:
+                print(f"Frames changed since {empty_file} was written; processing all frames")
+                return set()
+        return {frame_stem(name) for name in data["signatures"]}
+    except (OSError, ValueError, KeyError):
+        return set()
+
+def image_size(path):
+    """(height, width) of an image, read from the PNG or NPY header when possible"""
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r").shape[:2]
+    with open(path, "rb") as f:
+        header = f.read(24)
+    if header[:8] == b"\x89PNG\r\n\x1a\n":
+        width, height = struct.unpack(">II", header[16:24])
+        return height, width
+    image = read_image(path, cv2.IMREAD_UNCHANGED)
+    return image.shape[:2]
+
+_empty_cache = {}
+
+def write_empty_frame(output_path, shape, level=None):
+    """Write an all-zero (black mask / fully transparent) image, encoding each shape only once; returns the bytes"""
+    key = (shape, format_of(output_path), level)
+    data = _empty_cache.get(key)
+    if data is None:
+        data = encode(np.zeros(shape, np.uint8), key[1], level)
+        _empty_cache[key] = data
+    with open(output_path, "wb") as f:
+        f.write(data)
+    return data
@@ -2,23 +2,38 @@ import sys
 import os
 import json
 import subprocess
+import tempfile
 import psutil
 from pathlib import Path
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QWidget, QListWidget, QPushButton, 
-    QProgressBar, QTextEdit, QLabel, QTabWidget, QSplitter, QTreeView, QFileDialog,
+    QProgressBar, QTextEdit, QPlainTextEdit, QLabel, QTabWidget, QSplitter, QTreeView, QFileDialog,
     QMenuBar, QToolBar, QStatusBar, QDockWidget, QGraphicsView, QGraphicsScene, 
-    QCheckBox, QRadioButton, QSpinBox, QProgressDialog, QHBoxLayout, QListWidgetItem, QMessageBox, QScrollArea
+    QCheckBox, QRadioButton, QSpinBox, QProgressDialog, QHBoxLayout, QListWidgetItem, QMessageBox, QScrollArea,
+    QTableWidget, QTableWidgetItem, QGroupBox
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer
-from PyQt6.QtGui import QIcon, QAction
+from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer, QObject, QRunnable, QThreadPool, QSize
+from PyQt6.QtGui import QIcon, QAction, QPixmap
+from progress_events import EVENTS_ENV, EventAggregator
+from log_transport import LogBuffer, pump, DEFAULT_FLUSH_MS
+from thumbnail_cache import ThumbnailCache
+from shot_manifest import open_manifest
+from codecs_io import READ_EXTENSIONS
 
 CONFIG_FILE = "config.json"
+MONITOR_INTERVAL_MS = 1000
+LOG_HISTORY_LINES = 20000  # Oldest log lines are discarded past this
+IMAGE_EXTENSIONS = READ_EXTENSIONS
+
+def remove_events_file(events_path):
+    try:
+        os.remove(events_path)
+    except OSError:
+        pass  # Already removed
 
 class ProcessingThread(QThread):
     """ Runs the processing pipeline in a separate thread. """
     progress_signal = pyqtSignal(int)
-    log_signal = pyqtSignal(str)
     finished_signal = pyqtSignal()
 
     def __init__(self, files, steps):
@@ -26,6 +41,13 @@ class ProcessingThread(QThread):
         self.files = files
         self.steps = steps
 
+        # Output is coalesced here and drained by the GUI on a timer
+        self.log_buffer = LogBuffer()
+
+        # Stages append structured progress events here for the performance panel
+        fd, self.events_path = tempfile.mkstemp(prefix="ai_vfx_events_", suffix=".jsonl")
+        os.close(fd)
+
     def run(self):
         total_steps = len(self.files) * len(self.steps)
         progress = 0
@@ -33,18 +55,223 @@ class ProcessingThread(QThread):
         for file in self.files:
             for step in self.steps:
                 command = step["command"].format(input=file, output="output/")
-                self.log_signal.emit(f"Running: {command}")
+                self.log_buffer.feed(f"Running: {command}\n")
 
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-                for line in process.stdout:
-                    self.log_signal.emit(line.strip())
+                env = dict(os.environ, **{EVENTS_ENV: self.events_path})
+                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0, env=env)
+                pump(process.stdout, self.log_buffer)
                 process.wait()
+                self.log_buffer.feed("\n")  # Don't let a step's unterminated last line run into the next
 
                 progress += 1
                 self.progress_signal.emit(int(progress / total_steps * 100))
 
         self.finished_signal.emit()
 
+class PerformancePanel(QGroupBox):
+    """ Live per-stage throughput, ETA, queue depth and worker usage. """
+    COLUMNS = ["Stage", "Frames", "FPS", "ETA", "Queue", "PID", "CPU %", "RAM MB"]
+
+    def __init__(self, parent=None):
+        super().__init__("Performance", parent)
+        self.aggregator = None
+        self.processes = {}
+
+        layout = QVBoxLayout()
+        self.stage_table = QTableWidget(0, len(self.COLUMNS))
+        self.stage_table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.stage_table.verticalHeader().setVisible(False)
+        self.stage_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.stage_table)
+
+        layout.addWidget(QLabel("Slowest Frames:"))
+        self.slowest_list = QListWidget()
+        self.slowest_list.setMaximumHeight(120)
+        layout.addWidget(self.slowest_list)
+        self.setLayout(layout)
+
+    def watch(self, events_path):
+        """ Start following the events file of a new processing run. """
+        if self.aggregator is not None:
+            remove_events_file(self.aggregator.events_path)
+        self.aggregator = EventAggregator(events_path)
+        self.processes = {}
+        self.stage_table.setRowCount(0)
+        self.slowest_list.clear()
+
+    def finish(self, events_path):
+        """ Read the last events of a finished run, then delete its events file; the stats stay shown. """
+        if self.aggregator is not None and self.aggregator.events_path == events_path:
+            self.refresh()
+        remove_events_file(events_path)
+
+    def worker_usage(self, pid):
+        """ CPU % and RSS in MB of a stage process, or None once it has exited. """
+        try:
+            process = self.processes.get(pid)
+            if process is None:
+                process = self.processes[pid] = psutil.Process(pid)
+                process.cpu_percent(None)  # First call only primes the counter
+            with process.oneshot():
+                return process.cpu_percent(None), process.memory_info().rss / (1024 * 1024)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+
+    def refresh(self):
+        """ Pull new events and redraw the table. """
+        if self.aggregator is None:
+            return
+        self.aggregator.poll()
+        if not self.aggregator.order:
+            return
+
+        depths = self.aggregator.queue_depths()
+        self.stage_table.setRowCount(len(self.aggregator.order))
+        for row, stage in enumerate(self.aggregator.order):
+            stats = self.aggregator.stages[stage]
+            eta = stats.eta
+            usage = self.worker_usage(stats.pid) if stats.finished is None and stats.pid else None
+            values = [
+                stage,
+                f"{stats.done}/{stats.total}",
+                f"{stats.fps:.2f}",
+                "done" if stats.finished else ("--" if eta is None else f"{int(eta // 60)}:{int(eta % 60):02d}"),
+                str(depths.get(stage, "")),
+                str(stats.pid or ""),
+                f"{usage[0]:.0f}" if usage else "",
+                f"{usage[1]:.0f}" if usage else "",
+            ]
+            for column, value in enumerate(values):
+                self.stage_table.setItem(row, column, QTableWidgetItem(value))
+
+        self.slowest_list.clear()
+        for seconds, stage, frame in self.aggregator.slowest_frames():
+            self.slowest_list.addItem(f"{seconds * 1000:8.1f} ms  {stage}  {frame}")
+
+class ThumbnailSignals(QObject):
+    loaded = pyqtSignal(int, int, bytes)  # generation, row, JPEG data
+
+class ThumbnailTask(QRunnable):
+    """ Fetches one thumbnail from the cache on a pool thread. """
+
+    def __init__(self, cache, path, generation, row, signals):
+        super().__init__()
+        self.cache = cache
+        self.path = path
+        self.generation = generation
+        self.row = row
+        self.signals = signals
+
+    def run(self):
+        data = self.cache.get(self.path)
+        if data:
+            self.signals.loaded.emit(self.generation, self.row, data)
+
+class ThumbnailBrowser(QWidget):
+    """ Browse every frame of every output stage with lazily loaded thumbnails. """
+
+    def __init__(self, output_dir="output", parent=None):
+        super().__init__(parent)
+        self.output_dir = output_dir
+        self.cache = ThumbnailCache()
+        self.pool = QThreadPool()
+        self.signals = ThumbnailSignals()
+        self.signals.loaded.connect(self.set_thumbnail)
+        self.generation = 0
+        self.requested = set()
+
+        layout = QHBoxLayout()
+        self.stage_list = QListWidget()
+        self.stage_list.setMaximumWidth(220)
+        self.stage_list.currentTextChanged.connect(self.show_stage)
+        layout.addWidget(self.stage_list)
+
+        self.frame_view = QListWidget()
+        self.frame_view.setViewMode(QListWidget.ViewMode.IconMode)
+        self.frame_view.setIconSize(QSize(self.cache.size, self.cache.size))
+        self.frame_view.setResizeMode(QListWidget.ResizeMode.Adjust)
+        self.frame_view.setUniformItemSizes(True)
+        self.frame_view.setLayoutMode(QListWidget.LayoutMode.Batched)
+        self.frame_view.setMovement(QListWidget.Movement.Static)
+        self.frame_view.verticalScrollBar().valueChanged.connect(self.request_visible)
+        layout.addWidget(self.frame_view)
+        self.setLayout(layout)
+
+        # Layout happens asynchronously, so visible items are resolved on a short timer
+        self.visible_timer = QTimer(self)
+        self.visible_timer.setSingleShot(True)
+        self.visible_timer.setInterval(50)
+        self.visible_timer.timeout.connect(self.load_visible)
+
+    def refresh(self):
+        """ Reload the list of stage directories. """
+        current = self.stage_list.currentItem().text() if self.stage_list.currentItem() else None
+        self.stage_list.clear()
+        if not os.path.isdir(self.output_dir):
+            return
+        stages = [stage for stage, _, _ in open_manifest(self.output_dir).stages()]
+        self.stage_list.addItems(stages)
+        if current in stages:
+            self.stage_list.setCurrentRow(stages.index(current))
+
+    def list_frames(self, stage):
+        stage_dir = os.path.join(self.output_dir, stage)
+        return [os.path.join(stage_dir, name) for name in open_manifest(self.output_dir).frames(stage, IMAGE_EXTENSIONS)]
+
+    def show_stage(self, stage):
+        """ List the frames of a stage; thumbnails are requested only once visible. """
+        self.generation += 1  # Results for the previous stage are ignored
+        self.requested.clear()
+        self.pool.clear()
+        self.frame_view.clear()
+        if not stage:
+            return
+
+        for path in self.list_frames(stage):
+            item = QListWidgetItem(os.path.basename(path))
+            item.setData(Qt.ItemDataRole.UserRole, path)
+            item.setSizeHint(QSize(self.cache.size + 16, self.cache.size + 28))
+            self.frame_view.addItem(item)
+        self.request_visible()
+
+    def request_visible(self, *args):
+        self.visible_timer.start()
+
+    def load_visible(self):
+        """ Queue thumbnail jobs for the items currently in the viewport. """
+        viewport = self.frame_view.viewport().rect()
+        first = self.frame_view.indexAt(viewport.topLeft())
+        if not first.isValid():
+            return
+
+        # Items are uniform, so the visible range follows from the grid; indexAt(bottomRight)
+        # usually lands in the gap right of the last column or on a not yet laid out item
+        cell = self.frame_view.visualItemRect(self.frame_view.item(first.row()))
+        spacing = self.frame_view.spacing()
+        columns = max(1, viewport.width() // max(1, cell.width() + spacing))
+        rows = viewport.height() // max(1, cell.height() + spacing) + 2  # Partial rows at the top and bottom
+        span = columns * rows
+        end = min(first.row() + span, self.frame_view.count()) - 1
+
+        # Also prefetch one screen ahead so scrolling doesn't show blanks
+        for row in range(first.row(), min(end + span, self.frame_view.count() - 1) + 1):
+            if row in self.requested:
+                continue
+            self.requested.add(row)
+            path = self.frame_view.item(row).data(Qt.ItemDataRole.UserRole)
+            self.pool.start(ThumbnailTask(self.cache, path, self.generation, row, self.signals))
+
+    def set_thumbnail(self, generation, row, data):
+        if generation != self.generation or row >= self.frame_view.count():
+            return
+        pixmap = QPixmap()
+        if pixmap.loadFromData(data):
+            self.frame_view.item(row).setIcon(QIcon(pixmap))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.request_visible()
+
 class AI_VFX_GUI(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -58,6 +285,19 @@ class AI_VFX_GUI(QMainWindow):
 
         self.init_ui()
 
+        # Refresh system monitor and performance panel
+        self.monitor_timer = QTimer(self)
+        self.monitor_timer.timeout.connect(self.update_system_monitor)
+        self.monitor_timer.timeout.connect(self.performance_panel.refresh)
+        self.monitor_timer.start(MONITOR_INTERVAL_MS)
+
+        # Coalesce subprocess output into one UI update per interval
+        self.thread = None
+        self.preview_process = None
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.flush_logs)
+        self.log_timer.start(DEFAULT_FLUSH_MS)
+
     def init_ui(self):
         """ Set up UI components. """
         self.tabs = QTabWidget()
@@ -67,6 +307,7 @@ class AI_VFX_GUI(QMainWindow):
         self.setup_file_selection_tab()
         self.setup_processing_and_logs_tab()  # Changed to combined tab
         self.setup_cleaning_tab()
+        self.setup_browser_tab()
 
         # Status Bar
         self.status_bar = QStatusBar()
@@ -131,12 +372,19 @@ class AI_VFX_GUI(QMainWindow):
         self.run_all_button = QPushButton("Run Full Pipeline")
         self.run_all_button.clicked.connect(self.start_processing)
         button_layout.addWidget(self.run_all_button)
+        self.live_preview_button = QPushButton("Live Preview")
+        self.live_preview_button.clicked.connect(self.start_live_preview)
+        button_layout.addWidget(self.live_preview_button)
         
         processing_layout.addLayout(button_layout)
 
         # Progress Bar
         self.progress_bar = QProgressBar()
         processing_layout.addWidget(self.progress_bar)
+
+        # Live Performance
+        self.performance_panel = PerformancePanel()
+        processing_layout.addWidget(self.performance_panel)
         
         processing_widget.setLayout(processing_layout)
 
@@ -144,11 +392,16 @@ class AI_VFX_GUI(QMainWindow):
         logs_widget = QWidget()
         logs_layout = QVBoxLayout()
 
-        self.log_output = QTextEdit()
+        self.log_output = QPlainTextEdit()
         self.log_output.setReadOnly(True)
+        self.log_output.setMaximumBlockCount(LOG_HISTORY_LINES)
         logs_layout.addWidget(QLabel("Processing Logs:"))
         logs_layout.addWidget(self.log_output)
 
+        # In-place line for carriage-return progress output (tqdm)
+        self.log_progress = QLabel("")
+        logs_layout.addWidget(self.log_progress)
+
         # System Monitor
         self.system_monitor = QLabel("CPU: 0% | RAM: 0%")
         logs_layout.addWidget(self.system_monitor)
@@ -199,20 +452,29 @@ class AI_VFX_GUI(QMainWindow):
         # Initial directory load
         self.refresh_directories()
 
+    def setup_browser_tab(self):
+        """Create the output frame browser"""
+        self.browser = ThumbnailBrowser(self.config.get("output_dir", "output"))
+        self.tabs.addTab(self.browser, "Browse Outputs")
+        self.tabs.currentChanged.connect(
+            lambda index: self.browser.refresh() if self.tabs.widget(index) is self.browser else None
+        )
+
     def refresh_directories(self):
         """Refresh the list of available directories with buttons"""
         # Clear existing buttons
         for i in reversed(range(self.folder_buttons_layout.count())): 
             self.folder_buttons_layout.itemAt(i).widget().setParent(None)
 
-        # Add new buttons for each directory
-        for root, dirs, files in os.walk("output"):
-            for dir_name in dirs:
-                dir_path = os.path.join(root, dir_name)
-                if any(os.path.isfile(os.path.join(dir_path, f)) for f in os.listdir(dir_path)):
-                    button = QPushButton(dir_path)
-                    button.setCheckable(True)
-                    self.folder_buttons_layout.addWidget(button)
+        # Add new buttons for each stage directory holding files
+        output_dir = self.config.get("output_dir", "output")
+        if not os.path.isdir(output_dir):
+            return
+        for stage, frame_count, _ in open_manifest(output_dir).stages():
+            if frame_count:
+                button = QPushButton(os.path.join(output_dir, stage))
+                button.setCheckable(True)
+                self.folder_buttons_layout.addWidget(button)
 
     def clean_selected_directories(self):
         """Clean files from selected directory buttons"""
@@ -234,15 +496,17 @@ class AI_VFX_GUI(QMainWindow):
                                    QMessageBox.StandardButton.No)
 
         if reply == QMessageBox.StandardButton.Yes:
+            output_dir = self.config.get("output_dir", "output")
+            manifest = open_manifest(output_dir)
             for dir_path in selected_dirs:
+                stage = os.path.relpath(dir_path, output_dir).replace(os.sep, "/")  # Nested stages keep their subpath
                 try:
-                    for file_name in os.listdir(dir_path):
-                        file_path = os.path.join(dir_path, file_name)
-                        if os.path.isfile(file_path):
-                            os.unlink(file_path)
-                    self.log_output.append(f"Cleaned: {dir_path}")
+                    for file_name in manifest.frames(stage):
+                        os.unlink(os.path.join(dir_path, file_name))
+                    manifest.sync(stage, force=True)
+                    self.log_output.appendPlainText(f"Cleaned: {dir_path}")
                 except Exception as e:
-                    self.log_output.append(f"Error cleaning {dir_path}: {str(e)}")
+                    self.log_output.appendPlainText(f"Error cleaning {dir_path}: {str(e)}")
             
             QMessageBox.information(self, "Cleanup Complete", "Selected directories have been cleaned!")
             self.refresh_directories()
@@ -250,12 +514,12 @@ class AI_VFX_GUI(QMainWindow):
     def run_selected_step(self):
         """Run only the selected pipeline step"""
         if not self.file_list.count():
-            self.log_output.append("Error: No input files selected")
+            self.log_output.appendPlainText("Error: No input files selected")
             return
 
         selected_items = self.step_selector.selectedItems()
         if not selected_items:
-            self.log_output.append("Error: No pipeline step selected")
+            self.log_output.appendPlainText("Error: No pipeline step selected")
             return
 
         step_name = selected_items[0].text()
@@ -264,13 +528,15 @@ class AI_VFX_GUI(QMainWindow):
         if step:
             files = [self.file_list.item(i).text() for i in range(self.file_list.count())]
             self.thread = ProcessingThread([files[0]], [step])  # Process first file
+            self.performance_panel.watch(self.thread.events_path)
             self.thread.progress_signal.connect(self.progress_bar.setValue)
-            self.thread.log_signal.connect(self.log_output.append)
+            self.thread.finished_signal.connect(self.flush_logs)
+            self.thread.finished_signal.connect(lambda path=self.thread.events_path: self.performance_panel.finish(path))
             self.thread.finished_signal.connect(
                 lambda: self.status_bar.showMessage(f"Step '{step_name}' Completed!", 5000)
             )
             self.thread.start()
-            self.log_output.append(f"Running step: {step_name}")
+            self.log_output.appendPlainText(f"Running step: {step_name}")
 
     def load_files(self):
         """ Load files via QFileDialog """
@@ -286,18 +552,42 @@ class AI_VFX_GUI(QMainWindow):
             selected_folder = file_dialog.selectedFiles()[0]
             print("Selected Folder:", selected_folder)
 
+    def start_live_preview(self):
+        """Open the real-time cutout preview on the configured camera or stream"""
+        if self.preview_process and self.preview_process.poll() is None:
+            self.log_output.appendPlainText("Live preview is already running")
+            return
+        source = str(self.config.get("live_source", 0))
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "live_preview.py"), "--source", source]
+        self.preview_process = subprocess.Popen(command)
+        self.log_output.appendPlainText(f"Live preview started on source {source}")
+
     def start_processing(self):
         """ Start processing pipeline """
         files = [self.file_list.item(i).text() for i in range(self.file_list.count())]
         steps = self.config["steps"]
 
         self.thread = ProcessingThread(files, steps)
+        self.performance_panel.watch(self.thread.events_path)
         self.thread.progress_signal.connect(self.progress_bar.setValue)
-        self.thread.log_signal.connect(self.log_output.append)
+        self.thread.finished_signal.connect(self.flush_logs)
+        self.thread.finished_signal.connect(lambda path=self.thread.events_path: self.performance_panel.finish(path))
         self.thread.finished_signal.connect(lambda: self.status_bar.showMessage("Processing Completed!", 5000))
 
         self.thread.start()
 
+    def flush_logs(self):
+        """ Append all buffered log lines in a single update. """
+        if self.thread is None:
+            return
+        lines, dropped, current = self.thread.log_buffer.drain()
+        if dropped:
+            self.log_output.appendPlainText(f"... {dropped} lines dropped ...")
+        if lines:
+            self.log_output.appendPlainText("\n".join(lines))
+        if current is not None:
+            self.log_progress.setText(current)
+
     def update_system_monitor(self):
         """ Update system resource usage display """
         cpu_usage = psutil.cpu_percent()
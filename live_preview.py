@@ -0,0 +1,272 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import cv2
+import numpy as np
+from runtime_config import apply_runtime_config
+from background_processing import apply_mask
+
+INFERENCE_SIZE = 256     # SegFormer input (square); the batch stages use 512
+VIEW_WIDTH = 960         # Width the preview is composited and shown at
+MAX_LATENCY_MS = 200     # Frames older than this when inference could start are dropped
+SMOOTHING = 0.1          # Weight of the newest sample in the FPS / latency averages
+POLL_MS = 15             # GUI refresh interval
+
+def open_source(source):
+    """VideoCapture for a device index ("0"), a file path or a stream URL"""
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not capture.isOpened():
+        raise RuntimeError(f"Could not open video source {source}")
+    capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Devices: don't queue frames inside the driver
+    return capture
+
+class FrameGrabber(threading.Thread):
+    """Reads the source continuously and keeps only the newest frame.
+
+    A local file is read at its own frame rate (and optionally looped) so it
+    behaves like a live feed instead of being decoded as fast as possible.
+    """
+
+    def __init__(self, source, loop=False):
+        super().__init__(daemon=True)
+        self.capture = open_source(source)
+        self.loop = loop
+        fps = self.capture.get(cv2.CAP_PROP_FPS)
+        self.is_file = os.path.isfile(source)
+        self.frame_interval = 1.0 / fps if self.is_file and fps > 0 else 0.0
+        self.condition = threading.Condition()
+        self.latest = None  # (index, capture time, frame)
+        self.captured = 0
+        self.overwritten = 0  # Frames replaced before the consumer took them
+        self.running = True
+        self.finished = False
+
+    def run(self):
+        next_time = time.perf_counter()
+        try:
+            while self.running:
+                ok, frame = self.capture.read()
+                if not ok:
+                    if self.loop and self.is_file and self.captured:
+                        self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    break
+                with self.condition:
+                    if self.latest is not None:
+                        self.overwritten += 1
+                    self.latest = (self.captured, time.perf_counter(), frame)
+                    self.captured += 1
+                    self.condition.notify()
+                if self.frame_interval:
+                    next_time += self.frame_interval
+                    delay = next_time - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_time = time.perf_counter()  # Fell behind; don't burst to catch up
+        finally:
+            self.capture.release()
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+
+    def take(self, timeout=0.5):
+        """The newest frame not yet taken, waiting up to `timeout`; None if there is none"""
+        with self.condition:
+            if self.latest is None and not self.finished:
+                self.condition.wait(timeout)
+            item, self.latest = self.latest, None
+            return item
+
+    def stop(self):
+        self.running = False
+
+def checkerboard(height, width, square=16):
+    """Gray checkerboard shown behind transparent areas"""
+    y, x = np.indices((height, width))
+    board = np.where(((y // square) + (x // square)) % 2, 160, 96).astype(np.uint8)
+    return cv2.cvtColor(board, cv2.COLOR_GRAY2BGR)
+
+def composite(rgba, background):
+    """BGRA cutout over a BGR background of the same size"""
+    alpha = rgba[:, :, 3:4].astype(np.uint16)
+    blended = rgba[:, :, :3] * alpha + background * (255 - alpha)
+    return (blended // 255).astype(np.uint8)
+
+class LivePreview(threading.Thread):
+    """Segments the newest grabbed frame at reduced resolution and publishes the composited cutout"""
+
+    def __init__(self, grabber, predict, size=INFERENCE_SIZE, view_width=VIEW_WIDTH, max_latency_ms=MAX_LATENCY_MS):
+        super().__init__(daemon=True)
+        self.grabber = grabber
+        self.predict = predict
+        self.size = size
+        self.view_width = view_width
+        self.max_latency = max_latency_ms / 1000.0
+        self.lock = threading.Lock()
+        self.result = None  # (sequence, composite, stats)
+        self.sequence = 0
+        self.background = None
+        self.stale = 0
+        self.latencies = []
+        self.fps = 0.0
+        self.latency = 0.0
+        self.last_done = None
+        self.running = True
+
+    def run(self):
+        while self.running:
+            item = self.grabber.take()
+            if item is None:
+                if self.grabber.finished:
+                    break
+                continue
+            _, captured, frame = item
+            if time.perf_counter() - captured > self.max_latency:
+                self.stale += 1
+                continue
+            self.publish(self.process(frame), captured)
+
+    def process(self, frame):
+        height, width = frame.shape[:2]
+        scale = min(self.view_width / width, 1.0)
+        view = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA) if scale < 1.0 else frame
+
+        # Shrink before the processor so it never resizes a full-resolution frame
+        shrink = min(self.size / max(height, width), 1.0)
+        small = cv2.resize(frame, (max(int(width * shrink), 1), max(int(height * shrink), 1)), interpolation=cv2.INTER_AREA)
+        mask = self.predict(small, self.size)
+        mask = cv2.resize(mask, (view.shape[1], view.shape[0]), interpolation=cv2.INTER_LINEAR)
+
+        if self.background is None or self.background.shape != view.shape:
+            self.background = checkerboard(*view.shape[:2])
+        return composite(apply_mask(view, mask), self.background)
+
+    def publish(self, image, captured):
+        done = time.perf_counter()
+        latency = done - captured
+        self.latencies.append(latency)
+        if self.last_done is not None:
+            fps = 1.0 / max(done - self.last_done, 1e-6)
+            self.fps = fps if not self.fps else (1 - SMOOTHING) * self.fps + SMOOTHING * fps
+        self.latency = latency if not self.latency else (1 - SMOOTHING) * self.latency + SMOOTHING * latency
+        self.last_done = done
+        with self.lock:
+            self.sequence += 1
+            self.result = (self.sequence, image, self.stats())
+
+    def stats(self):
+        return {
+            "fps": self.fps,
+            "latency_ms": self.latency * 1000,
+            "processed": len(self.latencies),
+            "captured": self.grabber.captured,
+            "dropped": self.grabber.overwritten + self.stale,
+        }
+
+    def latest(self):
+        with self.lock:
+            return self.result
+
+    def stop(self):
+        """Stop both threads and wait for them, so OpenCV isn't torn down mid-read at exit"""
+        self.running = False
+        self.grabber.stop()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+        if self.grabber.is_alive():
+            self.grabber.join()
+
+def describe(stats):
+    return (f"{stats['fps']:.1f} FPS | latency {stats['latency_ms']:.0f} ms | "
+            f"{stats['processed']} shown, {stats['dropped']} dropped of {stats['captured']} captured")
+
+def run_headless(preview, frames):
+    """Process `frames` results without a display and print latency/FPS; for tests and CI"""
+    while preview.is_alive() and len(preview.latencies) < frames:
+        time.sleep(0.05)
+    preview.stop()
+    if not preview.latencies:
+        print("No frames were processed")
+        return 1
+    latencies = np.array(preview.latencies) * 1000
+    print(describe(preview.stats()))
+    print(f"latency ms: mean {latencies.mean():.1f}, p50 {np.percentile(latencies, 50):.1f}, "
+          f"p95 {np.percentile(latencies, 95):.1f}, max {latencies.max():.1f}")
+    return 0
+
+def run_gui(preview):
+    from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QLabel
+    from PyQt6.QtCore import Qt, QTimer
+    from PyQt6.QtGui import QImage, QPixmap
+
+    class PreviewWindow(QWidget):
+        def __init__(self):
+            super().__init__()
+            self.setWindowTitle("AI VFX Live Preview")
+            self.shown = 0
+            layout = QVBoxLayout()
+            self.view = QLabel("Waiting for frames...")
+            self.view.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            self.stats = QLabel("")
+            layout.addWidget(self.view)
+            layout.addWidget(self.stats)
+            self.setLayout(layout)
+
+            # Poll the newest result instead of queueing one signal per frame
+            self.timer = QTimer(self)
+            self.timer.timeout.connect(self.refresh)
+            self.timer.start(POLL_MS)
+
+        def refresh(self):
+            result = preview.latest()
+            if result is None or result[0] == self.shown:
+                if not preview.is_alive():
+                    self.stats.setText("Source ended")
+                return
+            self.shown, image, stats = result
+            height, width = image.shape[:2]
+            qimage = QImage(image.data, width, height, image.strides[0], QImage.Format.Format_BGR888)
+            self.view.setPixmap(QPixmap.fromImage(qimage))
+            self.stats.setText(describe(stats))
+
+        def closeEvent(self, event):
+            preview.stop()
+            super().closeEvent(event)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = PreviewWindow()
+    window.show()
+    code = app.exec()
+    preview.stop()
+    return code
+
+def main():
+    parser = argparse.ArgumentParser(description="Real-time person cutout preview from a camera, stream or video file")
+    parser.add_argument("--source", default="0", help="Device index, video file or stream URL")
+    parser.add_argument("--loop", action="store_true", help="Loop a video file (to test without a camera)")
+    parser.add_argument("--size", type=int, default=INFERENCE_SIZE, help="SegFormer input size")
+    parser.add_argument("--view-width", type=int, default=VIEW_WIDTH)
+    parser.add_argument("--max-latency", type=float, default=MAX_LATENCY_MS, help="Drop frames older than this (ms)")
+    parser.add_argument("--frames", type=int, default=0, help="Run headless for this many frames and print stats")
+    parser.add_argument("--tiny", action="store_true", help="Use a tiny random SegFormer (no download; masks are meaningless)")
+    args = parser.parse_args()
+
+    import segformer_background_removal as segformer
+    apply_runtime_config("live_preview")
+    if args.tiny:
+        from benchmark import install_tiny_segformer
+        install_tiny_segformer(segformer)
+
+    grabber = FrameGrabber(args.source, args.loop)
+    preview = LivePreview(grabber, segformer.predict_mask, args.size, args.view_width, args.max_latency)
+    grabber.start()
+    preview.start()
+    if args.frames:
+        return run_headless(preview, args.frames)
+    return run_gui(preview)
+
+if __name__ == "__main__":
+    sys.exit(main())
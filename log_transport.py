@@ -0,0 +1,65 @@
+import codecs
+import threading
+from collections import deque
+
+DEFAULT_FLUSH_MS = 100
+DEFAULT_MAX_LINES = 5000
+READ_CHUNK = 64 * 1024
+
+class LogBuffer:
+    """Thread-safe ring buffer that turns raw process output into log lines.
+
+    A carriage return rewinds the current line instead of starting a new
+    one, so tqdm progress bars update in place rather than adding a line
+    per refresh. Only the newest `max_lines` pending lines are kept.
+    """
+
+    def __init__(self, max_lines=DEFAULT_MAX_LINES):
+        self.lock = threading.Lock()
+        self.lines = deque(maxlen=max_lines)
+        self.current = ""
+        self.rewind = False
+        self.current_changed = False
+        self.dropped = 0
+
+    def feed(self, text):
+        """Add a chunk of output (any size, may contain partial lines)"""
+        with self.lock:
+            current, rewind = self.current, self.rewind
+            parts = text.split("\n")
+            for i, part in enumerate(parts):
+                for j, piece in enumerate(part.split("\r")):
+                    if j > 0:
+                        rewind = True
+                    if piece:
+                        current = piece if rewind else current + piece
+                        rewind = False
+                if i < len(parts) - 1:
+                    # "\r\n" ends the line rather than erasing it
+                    if len(self.lines) == self.lines.maxlen:
+                        self.dropped += 1
+                    self.lines.append(current)
+                    current, rewind = "", False
+            self.current_changed = self.current_changed or current != self.current
+            self.current, self.rewind = current, rewind
+
+    def drain(self):
+        """Return (completed lines, dropped count, in-place line or None if unchanged)"""
+        with self.lock:
+            lines = list(self.lines)
+            self.lines.clear()
+            dropped, self.dropped = self.dropped, 0
+            current = self.current if self.current_changed else None
+            self.current_changed = False
+            return lines, dropped, current
+
+def pump(stream, buffer, chunk_size=READ_CHUNK):
+    """Read a binary stream into a LogBuffer until EOF (run on a worker thread)"""
+    read = getattr(stream, "read1", stream.read)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        data = read(chunk_size)
+        if not data:
+            break
+        buffer.feed(decoder.decode(data))
+    buffer.feed(decoder.decode(b"", final=True))
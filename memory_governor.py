@@ -0,0 +1,123 @@
+import os
+import gc
+import json
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+CONFIG_FILE = "config.json"
+HIGH_WATER = 0.90       # Fraction of the budget at which knobs are halved
+LOW_WATER = 0.70        # Fraction of the budget below which knobs grow back
+CHECK_INTERVAL = 0.5    # Seconds between RSS samples
+GROW_COOLDOWN = 5.0     # Seconds after a change before a knob may grow again
+DEFAULT_SHARE = 0.8     # Share of available memory used when no budget is configured
+
+def cgroup_limit():
+    """Memory limit of this container/cgroup in bytes, or None when unlimited or unknown"""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path, "r") as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+    return None
+
+def load_budget_mb(config_file=CONFIG_FILE):
+    """The "memory_budget_mb" setting of config.json, or None"""
+    try:
+        with open(config_file, "r") as f:
+            return json.load(f).get("memory_budget_mb")
+    except (OSError, ValueError):
+        return None
+
+def default_budget():
+    """Bytes this run may use: a share of available memory, capped by the cgroup limit"""
+    budget = psutil.virtual_memory().available * DEFAULT_SHARE
+    limit = cgroup_limit()
+    if limit:
+        budget = min(budget, limit * HIGH_WATER)
+    return int(budget)
+
+class MemoryGovernor:
+    """Keeps a stage's resident memory under a budget by adapting its knobs.
+
+    Knobs are the settings that scale memory with resolution (batch size,
+    prefetch depth, frames in flight on a worker pool). Call check() once per
+    unit of work and read knobs back with governor["name"]: above the high
+    water mark every knob is halved, and below the low water mark they grow
+    back one step at a time (AIMD), up to the value they were registered with.
+    Without psutil the knobs simply keep their initial values.
+    """
+
+    def __init__(self, stage=None, budget_mb=None, include_children=False):
+        self.stage = stage or "pipeline"
+        self.include_children = include_children
+        self.knobs = {}
+        self.process = psutil.Process() if psutil else None
+        budget_mb = budget_mb if budget_mb is not None else load_budget_mb()
+        if self.process is None:
+            self.budget = None
+        else:
+            self.budget = int(budget_mb * 1024 * 1024) if budget_mb else default_budget()
+        self.last_check = 0.0
+        self.last_change = time.monotonic()
+        self.peak = 0
+
+    def knob(self, name, value, minimum=1):
+        """Register a knob with its preferred (and maximum) value; returns the current value"""
+        self.knobs[name] = {"value": value, "minimum": min(minimum, value), "maximum": value}
+        return value
+
+    def __getitem__(self, name):
+        return self.knobs[name]["value"]
+
+    def rss(self):
+        """Resident memory of this process (and its children, if asked) in bytes"""
+        rss = self.process.memory_info().rss
+        if self.include_children:
+            for child in self.process.children(recursive=True):
+                try:
+                    rss += child.memory_info().rss
+                except psutil.Error:
+                    pass  # Exited while we looked
+        return rss
+
+    def check(self):
+        """Sample RSS (at most every CHECK_INTERVAL) and adapt the knobs; True if any changed"""
+        if self.budget is None:
+            return False
+        now = time.monotonic()
+        if now - self.last_check < CHECK_INTERVAL:
+            return False
+        self.last_check = now
+        rss = self.rss()
+        self.peak = max(self.peak, rss)
+
+        if rss > HIGH_WATER * self.budget:
+            changed = self._adjust(lambda knob: max(knob["minimum"], knob["value"] // 2))
+            gc.collect()
+            if changed:
+                print(f" {self.stage}: {rss / 2**20:.0f} MB of {self.budget / 2**20:.0f} MB budget used; reducing {self.describe()}")
+            return changed
+        if rss < LOW_WATER * self.budget and now - self.last_change > GROW_COOLDOWN:
+            return self._adjust(lambda knob: min(knob["maximum"], knob["value"] + 1))
+        return False
+
+    def _adjust(self, rule):
+        changed = False
+        for knob in self.knobs.values():
+            value = rule(knob)
+            if value != knob["value"]:
+                knob["value"] = value
+                changed = True
+        if changed:
+            self.last_change = time.monotonic()
+        return changed
+
+    def describe(self):
+        return ", ".join(f"{name}={knob['value']}" for name, knob in self.knobs.items())
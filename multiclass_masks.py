@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import argparse
+import cv2
+import torch
+import numpy as np
+from tqdm import tqdm
+from runtime_config import apply_runtime_config
+from progress_events import track
+from deduplicate_frames import skip_duplicates, unlink_fanned_out, fan_out, frame_stem
+from empty_frames import load_empty_frames, image_size
+from shot_manifest import list_frames, open_manifest
+import segformer_background_removal as segformer
+
+CONFIG_FILE = "config.json"
+INPUT_DIR = "output/original_frames"
+OUTPUT_DIR = "output/class_masks"
+
+# ADE20K label ids, used when config.json has no "mask_classes" block
+DEFAULT_CLASSES = {"person": 12, "sky": 2, "car": 20}
+FORMATS = ["npz", "bitpacked", "png"]
+
+def load_classes(config_file=CONFIG_FILE):
+    try:
+        with open(config_file, "r") as f:
+            return json.load(f).get("mask_classes", DEFAULT_CLASSES)
+    except (OSError, ValueError):
+        return DEFAULT_CLASSES
+
+def compute_mattes(image_rgb, classes, probability=False, full_res=False):
+    """All class mattes from a single inference: {name: uint8 mask or probability matte}"""
+    logits = segformer.predict_logits(image_rgb)
+    labels = torch.tensor(list(classes.values()), device=logits.device)
+    probs = logits.float().softmax(dim=0)
+
+    if probability:
+        mattes = probs[labels]
+    else:
+        # Margin over the best competing label: > 0 exactly where argmax picks the class
+        top = probs.topk(2, dim=0)
+        is_best = top.indices[0][None] == labels[:, None, None]
+        competitor = torch.where(is_best, top.values[1][None], top.values[0][None])
+        mattes = probs[labels] - competitor
+
+    # Only the configured classes are upsampled, never all 150 labels
+    if full_res:
+        mattes = torch.nn.functional.interpolate(
+            mattes[None], size=image_rgb.shape[:2], mode="bilinear", align_corners=False)[0]
+
+    if probability:
+        mattes = (mattes.clamp(0, 1) * 255).round().to(torch.uint8).cpu().numpy()
+        return dict(zip(classes, mattes))
+
+    masks = (mattes > 0).to(torch.uint8).mul_(255).cpu().numpy()
+    return {name: segformer.clean_mask(mask) for name, mask in zip(classes, masks)}
+
+def empty_mattes(classes, shape):
+    """All-zero mattes for a frame person_prefilter.py found no one in"""
+    return {name: np.zeros(shape, np.uint8) for name in classes}
+
+def save_mattes(mattes, output_dir, frame_file, fmt):
+    """Write every matte of a frame into one container (npz, bit-packed PNG) or one PNG per class;
+    returns the (subdirectory, file name) pairs written"""
+    stem = os.path.splitext(frame_file)[0]
+    if fmt == "npz":
+        np.savez_compressed(os.path.join(output_dir, stem + ".npz"), **mattes)
+        return [("", stem + ".npz")]
+    if fmt == "bitpacked":
+        packed = np.zeros(next(iter(mattes.values())).shape, np.uint8)
+        for bit, mask in enumerate(mattes.values()):
+            packed |= (mask > 127).astype(np.uint8) << bit
+        cv2.imwrite(os.path.join(output_dir, stem + ".png"), packed)
+        return [("", stem + ".png")]
+    for name, matte in mattes.items():
+        cv2.imwrite(os.path.join(output_dir, name, stem + ".png"), matte)
+    return [(name, stem + ".png") for name in mattes]
+
+def load_mattes(path, classes=None):
+    """Read a frame's mattes back from an npz or bit-packed PNG container"""
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+    packed = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    classes = classes or load_classes()
+    return {name: ((packed >> bit) & 1) * np.uint8(255) for bit, name in enumerate(classes)}
+
+def main():
+    apply_runtime_config("class_masks")
+    parser = argparse.ArgumentParser(description="Generate several class mattes per frame from one SegFormer pass")
+    parser.add_argument("--format", choices=FORMATS, default="npz",
+                        help="npz: one compressed archive per frame; bitpacked: one PNG, one bit per class; png: a folder per class")
+    parser.add_argument("--probability", action="store_true", help="Write softmax probability mattes instead of binary masks")
+    parser.add_argument("--full-res", action="store_true", help="Upsample logits to frame size before thresholding")
+    parser.add_argument("--output", default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    classes = load_classes()
+    if args.format == "bitpacked" and (args.probability or len(classes) > 8):
+        print("bitpacked holds at most 8 binary masks; use --format npz or png")
+        return 1
+
+    os.makedirs(args.output, exist_ok=True)
+    if args.format == "png":
+        for name in classes:
+            os.makedirs(os.path.join(args.output, name), exist_ok=True)
+
+    frame_files = list_frames(INPUT_DIR, ('.png', '.jpg'))
+    ext = ".npz" if args.format == "npz" else ".png"
+    subdirs = list(classes) if args.format == "png" else [""]
+    output_dirs = [os.path.join(args.output, subdir) for subdir in subdirs]
+    frame_files, duplicates = skip_duplicates(frame_files, output_dirs[0], ext)
+    for output_dir in output_dirs[1:]:
+        unlink_fanned_out(frame_files, output_dir, ext)
+
+    # Outputs are recorded under output/<stage> (and output/<stage>/<class> for --format png)
+    manifest_dir, stage = os.path.split(os.path.normpath(args.output))
+    manifest = open_manifest(manifest_dir or ".")
+    stages = {subdir: f"{stage}/{subdir}" if subdir else stage for subdir in subdirs}
+
+    # An empty frame only has no person; other classes still need the model
+    empty_frames = load_empty_frames()
+    person_classes = [name for name, label in classes.items() if label == segformer.PERSON_LABEL]
+    person_only = len(person_classes) == len(classes)
+
+    for frame_file in tqdm(track("class_masks", frame_files), total=len(frame_files), desc="Generating class masks"):
+        input_path = os.path.join(INPUT_DIR, frame_file)
+        empty = frame_stem(frame_file) in empty_frames
+        if empty and person_only:
+            mattes = empty_mattes(classes, image_size(input_path) if args.full_res else segformer.mask_shape())
+        else:
+            image = cv2.imread(input_path)
+            if image is None:
+                print(f"Failed to load {frame_file}")
+                continue
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            mattes = compute_mattes(image_rgb, classes, args.probability, args.full_res)
+            if empty:
+                for name in person_classes:
+                    mattes[name][:] = 0
+        for subdir, name in save_mattes(mattes, args.output, frame_file, args.format):
+            manifest.record(stages[subdir], name)
+
+    for subdir, output_dir in zip(subdirs, output_dirs):
+        fan_out(output_dir, duplicates, ext)
+        manifest.sync(stages[subdir])
+        manifest.hash_missing(stages[subdir])
+    manifest.flush()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import os
+import cv2
+import torch
+import numpy as np
+from tqdm import tqdm
+from transformers import SegformerForSemanticSegmentation, AutoImageProcessor
+from runtime_config import apply_runtime_config
+from progress_events import track
+from deduplicate_frames import load_duplicates
+from empty_frames import save_empty_frames
+from shot_manifest import list_frames
+
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# A small model at low resolution is enough to tell whether anyone is in frame
+MODEL_NAME = "nvidia/segformer-b0-finetuned-ade-512-512"
+INPUT_SIZE = 256
+PERSON_LABEL = 12
+PERSON_PROBABILITY = 0.3   # Any pixel above this counts as a person being present
+MOTION_THRESHOLD = 2.0     # Mean abs difference (0-255) below which an empty frame stays empty
+RECHECK_EVERY = 12         # Run the model at least this often during a static empty run
+
+INPUT_DIR = os.path.join("output", "original_frames")
+
+processor = None
+model = None
+
+def load_model(model_name=MODEL_NAME):
+    """Load the prefilter SegFormer at its reduced input size"""
+    global processor, model
+    processor = AutoImageProcessor.from_pretrained(model_name, size={"height": INPUT_SIZE, "width": INPUT_SIZE})
+    model = SegformerForSemanticSegmentation.from_pretrained(model_name).to(device).eval()
+
+def person_present(image):
+    """Low-res SegFormer pass; True if any pixel is likely a person"""
+    if model is None:
+        load_model()
+    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    with torch.no_grad():
+        inputs = processor(images=image_rgb, return_tensors="pt").to(device)
+        probs = model(**inputs).logits[0].softmax(dim=0)
+    return probs[PERSON_LABEL].max().item() > PERSON_PROBABILITY
+
+def motion_thumbnail(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (160, 90), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+def find_empty_frames(input_dir=INPUT_DIR):
+    """Names of frames with no person, reusing the last result while nothing moves"""
+    duplicates = load_duplicates()
+    frame_files = list_frames(input_dir)
+    frame_files = [f for f in frame_files if f not in duplicates]
+
+    empty = set()
+    previous_thumb = None
+    previous_empty = False
+    since_check = 0
+    for frame_file in tqdm(track("prefilter", frame_files), total=len(frame_files), desc="Finding empty frames"):
+        image = cv2.imread(os.path.join(input_dir, frame_file), cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"Failed to load {frame_file}")
+            previous_thumb = None
+            continue
+
+        thumb = motion_thumbnail(image)
+        static = previous_thumb is not None and float(np.mean(np.abs(thumb - previous_thumb))) < MOTION_THRESHOLD
+        if previous_empty and static and since_check < RECHECK_EVERY:
+            is_empty = True
+            since_check += 1
+        else:
+            is_empty = not person_present(image)
+            since_check = 0
+
+        if is_empty:
+            empty.add(frame_file)
+        previous_thumb, previous_empty = thumb, is_empty
+
+    # Duplicates share their representative's result
+    empty.update(duplicate for duplicate, representative in duplicates.items() if representative in empty)
+    return sorted(empty)
+
+def main():
+    apply_runtime_config("prefilter")
+    empty = find_empty_frames()
+    save_empty_frames(empty, INPUT_DIR)
+    print(f" {len(empty)} frames contain no person and will be skipped by later stages")
+
+if __name__ == "__main__":
+    main()
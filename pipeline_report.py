@@ -1,6 +1,8 @@
 import os
 import json
 import datetime
+from shot_manifest import open_manifest
+from codecs_io import READ_EXTENSIONS
 
 def get_output_dir():
     # Load output_dir from config.json; default to "output" if not defined
@@ -13,7 +15,7 @@ def get_output_dir():
         return "output"
 
 def is_image(filename):
-    return filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif'))
+    return filename.lower().endswith(READ_EXTENSIONS + ('.bmp', '.gif'))
 
 def main():
     output_dir = get_output_dir()
@@ -21,26 +23,23 @@ def main():
         print(f"Output directory '{output_dir}' does not exist.")
         return
 
-    # List immediate subdirectories in the output directory
-    subdirs = [os.path.join(output_dir, d) for d in os.listdir(output_dir)
-               if os.path.isdir(os.path.join(output_dir, d))]
+    # Stages and their frames come from the shot manifest, not directory listings
+    manifest = open_manifest(output_dir)
+    stages = [stage for stage, _, _ in manifest.stages()]
     
-    if not subdirs:
+    if not stages:
         print(f"No subdirectories found in '{output_dir}'.")
         return
 
     print("Selected images from each output subdirectory:\n")
-    for subdir in subdirs:
-        # Look for image files in the current subdirectory
-        image_files = [f for f in os.listdir(subdir)
-                       if os.path.isfile(os.path.join(subdir, f)) and is_image(f)]
+    for stage in stages:
+        subdir = os.path.join(output_dir, stage)
+        # Look for image files in the current subdirectory (rows are sorted by name)
+        image_files = [row for row in manifest.rows(stage, sync=False) if is_image(row[0])]
         if image_files:
-            image_files.sort()  # pick the first image alphabetically
-            selected_image = image_files[0]
-            image_path = os.path.join(subdir, selected_image)
+            selected_image, file_size, mtime_ns, _ = image_files[0]  # pick the first image alphabetically
             # Optionally, show file size and last modified date
-            file_size = os.path.getsize(image_path)
-            mod_time = os.path.getmtime(image_path)
+            mod_time = mtime_ns / 1e9
             mod_time_str = datetime.datetime.fromtimestamp(mod_time).strftime('%Y-%m-%d %H:%M:%S')
             print(f"Directory: {subdir}")
             print(f"  Selected image: {selected_image}")
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import heapq
+from collections import deque
+
+# The GUI points this at a JSON-lines file; stages write nothing when it is unset
+EVENTS_ENV = "AI_VFX_EVENTS"
+
+class StageReporter:
+    """Writes structured progress events for one pipeline stage"""
+
+    def __init__(self, stage, total, events_path=None):
+        self.stage = stage
+        self.total = total
+        self.done = 0
+        path = events_path or os.environ.get(EVENTS_ENV)
+        self.file = open(path, "a", buffering=1, encoding="utf-8") if path else None
+        self.emit("start", total=total)
+
+    def emit(self, event, **fields):
+        if self.file is None:
+            return
+        record = {"t": time.time(), "pid": os.getpid(), "stage": self.stage, "event": event}
+        record.update(fields)
+        self.file.write(json.dumps(record) + "\n")
+
+    def frame_done(self, frame, seconds, frames=1):
+        """Report that `frames` frames (a single frame or a batch) took `seconds`"""
+        self.done += frames
+        self.emit("frame", frame=frame, seconds=seconds, frames=frames, done=self.done)
+
+    def finish(self):
+        self.emit("end", done=self.done)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def track(stage, items, events_path=None):
+    """Yield items while reporting how long the loop body took for each one"""
+    items = list(items)
+    reporter = StageReporter(stage, len(items), events_path)
+    try:
+        for item in items:
+            start = time.perf_counter()
+            yield item
+            reporter.frame_done(str(item), time.perf_counter() - start)
+    finally:
+        reporter.finish()
+
+class StageStats:
+    """Running statistics for one stage, built from its events"""
+
+    def __init__(self, stage, window=30):
+        self.stage = stage
+        self.pid = None
+        self.total = 0
+        self.done = 0
+        self.started = None
+        self.finished = None
+        self.recent = deque(maxlen=window)  # (timestamp, frames)
+
+    @property
+    def fps(self):
+        if len(self.recent) < 2:
+            return 0.0
+        span = self.recent[-1][0] - self.recent[0][0]
+        frames = sum(frames for _, frames in list(self.recent)[1:])
+        return frames / span if span > 0 else 0.0
+
+    @property
+    def eta(self):
+        """Seconds left for this stage, or None when unknown"""
+        if self.finished is not None:
+            return 0.0
+        fps = self.fps
+        if fps <= 0:
+            return None
+        return max(self.total - self.done, 0) / fps
+
+class EventAggregator:
+    """Tails an events file and keeps per-stage throughput statistics"""
+
+    def __init__(self, events_path, slowest=10):
+        self.events_path = events_path
+        self.offset = 0
+        self.partial = ""
+        self.stages = {}
+        self.order = []
+        self.slowest_count = slowest
+        self.slowest = []  # min-heap of (seconds, stage, frame)
+
+    def poll(self):
+        """Read any new events; returns the number of events consumed"""
+        if not self.events_path or not os.path.exists(self.events_path):
+            return 0
+        with open(self.events_path, "r", encoding="utf-8") as f:
+            f.seek(self.offset)
+            data = f.read()
+            self.offset = f.tell()
+
+        lines = (self.partial + data).split("\n")
+        self.partial = lines.pop()  # Keep an incomplete trailing line for next time
+        count = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                self.handle(json.loads(line))
+                count += 1
+            except (ValueError, KeyError):
+                continue
+        return count
+
+    def handle(self, record):
+        stage = record["stage"]
+        if stage not in self.stages:
+            self.stages[stage] = StageStats(stage)
+            self.order.append(stage)
+        stats = self.stages[stage]
+        stats.pid = record.get("pid", stats.pid)
+        event = record["event"]
+
+        if event == "start":
+            stats.total = record.get("total", 0)
+            stats.done = 0
+            stats.started = record["t"]
+            stats.finished = None
+            stats.recent.clear()
+            stats.recent.append((record["t"], 0))
+        elif event == "frame":
+            stats.done = record.get("done", stats.done + 1)
+            stats.recent.append((record["t"], record.get("frames", 1)))
+            entry = (record.get("seconds", 0.0), stage, record.get("frame", ""))
+            if len(self.slowest) < self.slowest_count:
+                heapq.heappush(self.slowest, entry)
+            elif entry > self.slowest[0]:
+                heapq.heapreplace(self.slowest, entry)
+        elif event == "end":
+            stats.finished = record["t"]
+
+    def queue_depths(self):
+        """Frames produced by each stage but not yet consumed by the next one"""
+        depths = {}
+        for upstream, downstream in zip(self.order, self.order[1:]):
+            depths[downstream] = max(self.stages[upstream].done - self.stages[downstream].done, 0)
+        return depths
+
+    def slowest_frames(self):
+        return sorted(self.slowest, reverse=True)
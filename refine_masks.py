@@ -2,6 +2,12 @@ import os
 import cv2
 import numpy as np
 from tqdm import tqdm
+from runtime_config import apply_runtime_config
+from progress_events import track
+from deduplicate_frames import skip_duplicates, fan_out, frame_stem
+from empty_frames import load_empty_frames, write_empty_frame, image_size
+from shot_manifest import open_manifest
+from codecs_io import EXTENSIONS, READ_EXTENSIONS, stage_codec, frame_name, read_image, write_image
 
 # Define directories
 OUTPUT_DIR = "output"
@@ -11,18 +17,14 @@ REFINED_MASKS_DIR = os.path.join(OUTPUT_DIR, "refined_masks")
 
 os.makedirs(REFINED_MASKS_DIR, exist_ok=True)
 
-def refine_mask(mask_path, motion_vector_path, output_path):
-    """Refines AI segmentation masks using motion vectors."""
-    if not os.path.exists(mask_path) or not os.path.exists(motion_vector_path):
-        print(f" Skipping {mask_path} - Missing mask or motion vector.")
-        return  # Skip missing files
-
-    mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
-    motion_vector = cv2.imread(motion_vector_path, cv2.IMREAD_GRAYSCALE)
+def refine_mask(mask_path, motion_vector_path, output_path, level=None):
+    """Refines AI segmentation masks using motion vectors; returns the written bytes, or None."""
+    mask = read_image(mask_path, cv2.IMREAD_GRAYSCALE)
+    motion_vector = read_image(motion_vector_path, cv2.IMREAD_GRAYSCALE)
 
     if mask is None or motion_vector is None:
         print(f" Error: Could not read {mask_path} or {motion_vector_path}. Skipping...")
-        return
+        return None
 
     # Ensure mask and motion vector are the same size
     if mask.shape != motion_vector.shape:
@@ -32,22 +34,42 @@ def refine_mask(mask_path, motion_vector_path, output_path):
     refined_mask = cv2.bitwise_and(mask, motion_vector)
 
     # Save the refined mask
-    cv2.imwrite(output_path, refined_mask)
+    return write_image(output_path, refined_mask, level=level)
 
 def refine_masks():
     """Processes all frames."""
-    frame_files = sorted([f for f in os.listdir(MASKS_DIR) if f.endswith(".png")])
+    apply_runtime_config("refine_masks")
+    manifest = open_manifest(OUTPUT_DIR)
+    frame_files = manifest.frames("masks", READ_EXTENSIONS)
 
     if not frame_files:
         print(" No AI masks found. Ensure AI Processing completed first.")
         return
 
-    for frame_file in tqdm(frame_files, desc="Refining masks"):
+    fmt, level = stage_codec("refined_masks")
+    frame_files, duplicates = skip_duplicates(frame_files, REFINED_MASKS_DIR, EXTENSIONS[fmt])
+    empty_frames = load_empty_frames()
+    motion_vectors = manifest.frames_by_stem("motion_vectors")
+
+    for frame_file in tqdm(track("refine_masks", frame_files), total=len(frame_files), desc="Refining masks"):
         mask_path = os.path.join(MASKS_DIR, frame_file)
-        motion_vector_path = os.path.join(MOTION_VECTORS_DIR, frame_file)
-        output_path = os.path.join(REFINED_MASKS_DIR, frame_file)
+        motion_vector = motion_vectors.get(frame_stem(frame_file))
+        output_file = frame_name(frame_file, fmt)
+        output_path = os.path.join(REFINED_MASKS_DIR, output_file)
+
+        if frame_stem(frame_file) in empty_frames:
+            data = write_empty_frame(output_path, image_size(mask_path), level)
+        elif motion_vector is None:
+            print(f" Skipping {mask_path} - Missing mask or motion vector.")
+            continue
+        else:
+            data = refine_mask(mask_path, os.path.join(MOTION_VECTORS_DIR, motion_vector), output_path, level)
+        if data is not None:
+            manifest.record("refined_masks", output_file, data)
 
-        refine_mask(mask_path, motion_vector_path, output_path)
+    fan_out(REFINED_MASKS_DIR, duplicates, EXTENSIONS[fmt])
+    manifest.sync("refined_masks")
+    manifest.hash_missing("refined_masks")
 
     print(" Mask Refinement Completed!")
 
@@ -0,0 +1,48 @@
+import sys
+import json
+import cv2
+
+CONFIG_FILE = "config.json"
+
+def load_runtime(config_file=CONFIG_FILE):
+    """The "runtime" block of config.json written by autotune.py, or {}"""
+    try:
+        with open(config_file, "r") as f:
+            return json.load(f).get("runtime", {})
+    except (OSError, ValueError):
+        return {}
+
+def get_setting(name, default=None, stage=None, runtime=None):
+    """A runtime setting, preferring a per-stage override under "stages" when present"""
+    runtime = load_runtime() if runtime is None else runtime
+    stage_settings = runtime.get("stages", {}).get(stage, {}) if stage else {}
+    return stage_settings.get(name, runtime.get(name, default))
+
+def stage_setting(name, default=None, stage=None, runtime=None):
+    """A setting from the stage's own "stages" override only; for stages the global tuned values don't fit"""
+    runtime = load_runtime() if runtime is None else runtime
+    return runtime.get("stages", {}).get(stage, {}).get(name, default)
+
+def apply_runtime_config(stage=None):
+    """Apply tuned thread counts for this process; call once at stage startup"""
+    runtime = load_runtime()
+    if not runtime:
+        return runtime
+
+    cv2_threads = get_setting("cv2_threads", stage=stage, runtime=runtime)
+    if cv2_threads is not None:
+        cv2.setNumThreads(int(cv2_threads))
+
+    # Only touch torch in stages that already use it
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch_threads = get_setting("torch_threads", stage=stage, runtime=runtime)
+        if torch_threads:
+            torch.set_num_threads(int(torch_threads))
+        interop_threads = get_setting("torch_interop_threads", stage=stage, runtime=runtime)
+        if interop_threads:
+            try:
+                torch.set_num_interop_threads(int(interop_threads))
+            except RuntimeError:
+                pass  # Can only be set before the first parallel torch call
+    return runtime
@@ -3,6 +3,12 @@ import cv2
 import torch
 import numpy as np
 from tqdm import tqdm
+from runtime_config import apply_runtime_config
+from progress_events import track
+from deduplicate_frames import skip_duplicates, fan_out, frame_stem
+from empty_frames import load_empty_frames, write_empty_frame
+from shot_manifest import open_manifest
+from codecs_io import EXTENSIONS, stage_codec, frame_name, write_image
 from transformers import SegformerForSemanticSegmentation, AutoImageProcessor
 
 # Enable CUDA optimizations
@@ -12,52 +18,100 @@ torch.backends.cudnn.allow_tf32 = True
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-# Load model
+# Model is loaded on first use so the module can be imported without it
 MODEL_NAME = "nvidia/segformer-b3-finetuned-ade-512-512"
-processor = AutoImageProcessor.from_pretrained(MODEL_NAME)
-model = SegformerForSemanticSegmentation.from_pretrained(MODEL_NAME).to(device).eval()
+PERSON_LABEL = 12  # ADE20K "person"
+OUTPUT_STRIDE = 4  # SegFormer logits are 1/4 of the processor input in each dimension
+processor = None
+model = None
 
 # Paths
 INPUT_DIR = "output/original_frames"
 OUTPUT_DIR = "output/masks"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def process_frame(image_path, output_path):
-    """Generate person mask for a single frame"""
-    image = cv2.imread(image_path)
-    if image is None:
-        print(f"Failed to load {image_path}")
-        return False
-    
+def load_model(model_name=MODEL_NAME):
+    """Load the SegFormer processor and model onto the active device"""
+    global processor, model
+    processor = AutoImageProcessor.from_pretrained(model_name)
+    model = SegformerForSemanticSegmentation.from_pretrained(model_name).to(device).eval()
+
+def predict_logits(image_rgb, size=None):
+    """Raw SegFormer logits (num_labels, h, w) for an RGB frame, optionally run at size x size"""
+    if model is None:
+        load_model()
+    resize = {"size": {"height": size, "width": size}} if size else {}
+    with torch.no_grad():
+        inputs = processor(images=image_rgb, return_tensors="pt", **resize).to(device)
+        return model(**inputs).logits[0]
+
+def mask_shape(size=None):
+    """(height, width) of the masks predict_mask returns, without running the model"""
+    if size:
+        height = width = size
+    else:
+        if processor is None:
+            load_model()
+        height, width = processor.size["height"], processor.size["width"]
+    return -(-height // OUTPUT_STRIDE), -(-width // OUTPUT_STRIDE)
+
+def clean_mask(mask):
+    """Close small holes in a binary mask"""
+    kernel = np.ones((5,5), np.uint8)
+    return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+def predict_mask(image, size=None):
+    """Person mask (at logits resolution) for a BGR frame; `size` lowers the inference resolution"""
     # Prepare image
     image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
     
     # Generate mask
-    with torch.no_grad():
-        inputs = processor(images=image_rgb, return_tensors="pt").to(device)
-        outputs = model(**inputs)
-        mask = (outputs.logits[0].argmax(dim=0) == 12).cpu().numpy().astype(np.uint8) * 255
+    logits = predict_logits(image_rgb, size)
+    mask = (logits.argmax(dim=0) == PERSON_LABEL).cpu().numpy().astype(np.uint8) * 255
     
     # Clean up mask
-    kernel = np.ones((5,5), np.uint8)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    return clean_mask(mask)
+
+def process_frame(image_path, output_path, level=None):
+    """Generate person mask for a single frame; returns the written bytes, or None on failure"""
+    image = cv2.imread(image_path)
+    if image is None:
+        print(f"Failed to load {image_path}")
+        return None
+    
+    mask = predict_mask(image)
     
-    # Save mask
-    cv2.imwrite(output_path, mask)
-    return True
+    # Save mask with the codec its extension names
+    return write_image(output_path, mask, level=level)
 
 def main():
     """Process all frames in the input directory"""
-    frame_files = sorted([f for f in os.listdir(INPUT_DIR) if f.endswith(('.png', '.jpg'))])
+    apply_runtime_config("segformer")
+    manifest = open_manifest()
+    frame_files = manifest.frames("original_frames", ('.png', '.jpg'))
     
     if not frame_files:
         print("No frames found in input directory!")
         return
 
-    for frame_file in tqdm(frame_files, desc="Generating masks"):
+    fmt, level = stage_codec("masks")
+    frame_files, duplicates = skip_duplicates(frame_files, OUTPUT_DIR, EXTENSIONS[fmt])
+    empty_frames = load_empty_frames()
+
+    for frame_file in tqdm(track("segformer", frame_files), total=len(frame_files), desc="Generating masks"):
         input_path = os.path.join(INPUT_DIR, frame_file)
-        output_path = os.path.join(OUTPUT_DIR, frame_file)
-        process_frame(input_path, output_path)
+        output_file = frame_name(frame_file, fmt)
+        output_path = os.path.join(OUTPUT_DIR, output_file)
+        if frame_stem(frame_file) in empty_frames:
+            data = write_empty_frame(output_path, mask_shape(), level)  # Same size as the real masks
+        else:
+            data = process_frame(input_path, output_path, level)
+        if data is not None:
+            manifest.record("masks", output_file, data)
+
+    fan_out(OUTPUT_DIR, duplicates, EXTENSIONS[fmt])
+    manifest.sync("masks")
+    manifest.hash_missing("masks")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,209 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+import subprocess
+import cv2
+from progress_events import StageReporter
+from shm_ring import FrameRing, PeerDiedError
+from runtime_config import apply_runtime_config
+from shot_manifest import list_frames, open_manifest
+from codecs_io import stage_codec, frame_name, write_image
+
+INPUT_DIR = "output/original_frames"
+OUTPUT_DIR = "output/final_cutouts"
+RING_SLOTS = 8
+MAX_RESTARTS = 3
+
+# Ring name -> number of consumers. The cutout stage reads frames straight
+# from the decode ring, so a frame is never copied between stages.
+RINGS = {"frames": 2, "masks": 1, "cutouts": 1}
+ROLES = ["decode", "mask", "cutout", "refine"]
+
+def ring_name(prefix, ring):
+    return f"{prefix}_{ring}"
+
+def ring_prefix(output_dir):
+    """Same for every run into `output_dir`, so a later run finds and replaces rings a killed run left behind"""
+    return "aivfx_" + hashlib.sha1(os.path.abspath(output_dir).encode("utf-8")).hexdigest()[:12]
+
+def catch_up(ring, consumer, produced):
+    """After a restart, release inputs whose output was already published"""
+    while ring.tail(consumer) < produced:
+        ring.release(consumer)
+
+def run_decode(prefix, input_dir, total):
+    frames = FrameRing.attach(ring_name(prefix, "frames"))
+    reporter = StageReporter("shm_decode", total)
+    # A restarted decoder resumes at the first frame not yet published
+    for frame_file in list_frames(input_dir)[frames.head:]:
+        start = time.perf_counter()
+        image = cv2.imread(os.path.join(input_dir, frame_file), cv2.IMREAD_COLOR)
+        if image is None:
+            raise RuntimeError(f"Failed to load {frame_file}")
+        _, slot = frames.reserve()
+        if image.shape != slot["frame"].shape:
+            raise RuntimeError(f"{frame_file} is {image.shape}, ring slots are {slot['frame'].shape}")
+        slot["frame"][...] = image
+        frames.publish(frame_file)
+        reporter.frame_done(frame_file, time.perf_counter() - start)
+    frames.close_writer()
+    reporter.finish()
+
+def run_mask(prefix, total):
+    import segformer_background_removal as segformer
+
+    frames = FrameRing.attach(ring_name(prefix, "frames"))
+    masks = FrameRing.attach(ring_name(prefix, "masks"))
+    reporter = StageReporter("shm_mask", total)
+    catch_up(frames, 0, masks.head)
+    while (item := frames.next(0)) is not None:
+        start = time.perf_counter()
+        _, frame_file, inputs = item
+        mask = segformer.predict_mask(inputs["frame"])
+        _, slot = masks.reserve()
+        height, width = slot["mask"].shape
+        cv2.resize(mask, (width, height), dst=slot["mask"], interpolation=cv2.INTER_NEAREST)
+        masks.publish(frame_file)
+        frames.release(0)
+        reporter.frame_done(frame_file, time.perf_counter() - start)
+    masks.close_writer()
+    reporter.finish()
+
+def run_cutout(prefix, total):
+    from background_processing import apply_mask
+
+    frames = FrameRing.attach(ring_name(prefix, "frames"))
+    masks = FrameRing.attach(ring_name(prefix, "masks"))
+    cutouts = FrameRing.attach(ring_name(prefix, "cutouts"))
+    reporter = StageReporter("shm_cutout", total)
+    catch_up(frames, 1, cutouts.head)
+    catch_up(masks, 0, cutouts.head)
+    while (mask_item := masks.next(0)) is not None:
+        start = time.perf_counter()
+        frame_item = frames.next(1)
+        if frame_item is None or frame_item[0] != mask_item[0]:
+            raise RuntimeError("Frame and mask rings are out of step")
+        _, frame_file, mask_slot = mask_item
+        _, slot = cutouts.reserve()
+        apply_mask(frame_item[2]["frame"], mask_slot["mask"], out=slot["rgba"])
+        cutouts.publish(frame_file)
+        masks.release(0)
+        frames.release(1)
+        reporter.frame_done(frame_file, time.perf_counter() - start)
+    cutouts.close_writer()
+    reporter.finish()
+
+def run_refine(prefix, output_dir, total):
+    from edge_refinement import refine_edges
+
+    cutouts = FrameRing.attach(ring_name(prefix, "cutouts"))
+    reporter = StageReporter("shm_refine", total)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_dir, stage = os.path.split(os.path.normpath(output_dir))
+    manifest = open_manifest(manifest_dir or ".")
+    fmt, level = stage_codec(stage)
+    while (item := cutouts.next(0)) is not None:
+        start = time.perf_counter()
+        _, frame_file, slot = item
+        output_file = frame_name(frame_file, fmt)
+        data = write_image(os.path.join(output_dir, output_file), refine_edges(slot["rgba"]), fmt, level)
+        cutouts.release(0)
+        manifest.record(stage, output_file, data)
+        reporter.frame_done(frame_file, time.perf_counter() - start)
+    manifest.flush()
+    reporter.finish()
+
+def run_role(args):
+    apply_runtime_config(f"shm_{args.role}")
+    if args.role == "decode":
+        run_decode(args.prefix, args.input, args.total)
+    elif args.role == "mask":
+        run_mask(args.prefix, args.total)
+    elif args.role == "cutout":
+        run_cutout(args.prefix, args.total)
+    else:
+        run_refine(args.prefix, args.output, args.total)
+
+def create_rings(prefix, height, width, slots=RING_SLOTS):
+    fields = {
+        "frames": [("frame", (height, width, 3), "uint8")],
+        "masks": [("mask", (height, width), "uint8")],
+        "cutouts": [("rgba", (height, width, 4), "uint8")],
+    }
+    return {ring: FrameRing.create(ring_name(prefix, ring), fields[ring], slots, consumers, supervised=True)
+            for ring, consumers in RINGS.items()}
+
+def spawn(role, prefix, args, total):
+    command = [sys.executable, os.path.abspath(__file__), "--role", role, "--prefix", prefix,
+               "--input", args.input, "--output", args.output, "--total", str(total)]
+    return subprocess.Popen(command)
+
+def run_pipeline(args):
+    """Create the rings, run every stage as its own process and restart crashed ones"""
+    frame_files = list_frames(args.input)
+    if not frame_files:
+        print("No frames found in input directory!")
+        return 1
+    first = cv2.imread(os.path.join(args.input, frame_files[0]), cv2.IMREAD_COLOR)
+    height, width = first.shape[:2]
+
+    prefix = ring_prefix(args.output)
+    try:
+        rings = create_rings(prefix, height, width, args.slots)
+    except FileExistsError:
+        print(f"Another shared-memory pipeline is already writing to {args.output}")
+        return 1
+    processes = {role: spawn(role, prefix, args, len(frame_files)) for role in ROLES}
+    restarts = {role: 0 for role in ROLES}
+    try:
+        while processes:
+            for role, process in list(processes.items()):
+                code = process.poll()
+                if code is None:
+                    continue
+                if code == 0:
+                    del processes[role]
+                    continue
+                if restarts[role] >= MAX_RESTARTS:
+                    raise RuntimeError(f"Stage '{role}' failed {MAX_RESTARTS + 1} times (exit code {code})")
+                restarts[role] += 1
+                print(f" Stage '{role}' exited with code {code}; restarting ({restarts[role]}/{MAX_RESTARTS})")
+                processes[role] = spawn(role, prefix, args, len(frame_files))
+            time.sleep(0.1)
+        print(f" Shared-memory pipeline finished: {len(frame_files)} frames written to {args.output}")
+        return 0
+    except (KeyboardInterrupt, RuntimeError) as e:
+        print(f" Stopping pipeline: {e}")
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.wait()
+        return 1
+    finally:
+        for ring in rings.values():
+            ring.close()
+            ring.unlink()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run decode, mask, cutout and refine as processes sharing frames through shared memory")
+    parser.add_argument("--input", default=INPUT_DIR)
+    parser.add_argument("--output", default=OUTPUT_DIR)
+    parser.add_argument("--slots", type=int, default=RING_SLOTS, help="Frames in flight between two stages")
+    parser.add_argument("--role", choices=ROLES, help=argparse.SUPPRESS)
+    parser.add_argument("--prefix", help=argparse.SUPPRESS)
+    parser.add_argument("--total", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role:
+        try:
+            run_role(args)
+        except PeerDiedError as e:
+            print(f" {args.role}: {e}")
+            return 1
+        return 0
+    return run_pipeline(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
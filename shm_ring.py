@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+MAGIC = 0x41495646  # "AIVF"
+MAX_CONSUMERS = 4
+NAME_BYTES = 64     # Frame name stored alongside every slot
+SPEC_BYTES = 4096   # JSON description of the slot fields, so attachers need no arguments
+ALIGN = 64
+PEER_GRACE = 2.0    # Unsupervised rings: seconds a peer pid may stay dead before waiting fails
+
+# Header layout (int64 words)
+H_MAGIC, H_SLOTS, H_CONSUMERS, H_HEAD, H_CLOSED, H_OWNER_PID, H_PRODUCER_PID, H_SUPERVISOR_PID = range(8)
+H_TAILS = 8
+H_CONSUMER_PIDS = H_TAILS + MAX_CONSUMERS
+HEADER_WORDS = H_CONSUMER_PIDS + MAX_CONSUMERS
+
+class PeerDiedError(RuntimeError):
+    """The process on the other side of a ring exited without closing it"""
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+def _layout(fields, slots):
+    """Byte offset of every section: header, spec, names, then one array per field"""
+    offset = _align(HEADER_WORDS * 8)
+    spec_offset = offset
+    offset = _align(offset + SPEC_BYTES)
+    names_offset = offset
+    offset = _align(offset + slots * NAME_BYTES)
+    field_offsets = {}
+    for name, shape, dtype in fields:
+        field_offsets[name] = offset
+        offset = _align(offset + slots * int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    return spec_offset, names_offset, field_offsets, offset
+
+def pid_alive(pid):
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+def _open_untracked(name):
+    """Attach to an existing segment without letting this process unlink it at exit"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+class FrameRing:
+    """Fixed-size ring of frame slots in shared memory, one producer and up to four consumers.
+
+    Each slot holds one frame name plus a NumPy array per field (e.g. a
+    BGR frame and a mask). The producer reserves a slot, fills the views
+    in place and publishes it; each consumer reads slots in order and
+    releases them. A slot is reused only once every consumer released it.
+
+    Cursors live in the segment, so a restarted consumer resumes from its
+    last released slot and a restarted producer from the last published
+    one. A ring created with supervised=True leaves dead peers to its
+    creator, which restarts them however long that takes; waiting sides
+    only raise PeerDiedError once the supervisor itself is gone. Otherwise
+    a peer that stays dead for PEER_GRACE seconds raises PeerDiedError.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((HEADER_WORDS,), np.int64, shm.buf)
+        if self.header[H_MAGIC] != MAGIC:
+            raise ValueError(f"Shared memory '{shm.name}' is not a frame ring")
+
+        self.slots = int(self.header[H_SLOTS])
+        self.consumers = int(self.header[H_CONSUMERS])
+        spec_offset, _, _, _ = _layout([], self.slots)
+        spec = bytes(shm.buf[spec_offset:spec_offset + SPEC_BYTES]).rstrip(b"\0")
+        self.fields = [(name, tuple(shape), dtype) for name, shape, dtype in json.loads(spec)]
+
+        _, names_offset, field_offsets, _ = _layout(self.fields, self.slots)
+        self.names = np.ndarray((self.slots, NAME_BYTES), np.uint8, shm.buf, names_offset)
+        self.arrays = {
+            name: np.ndarray((self.slots,) + shape, np.dtype(dtype), shm.buf, field_offsets[name])
+            for name, shape, dtype in self.fields
+        }
+
+    @classmethod
+    def create(cls, name, fields, slots=8, consumers=1, supervised=False):
+        """Create a ring; a stale segment of the same name left by a dead owner is replaced"""
+        if not 1 <= consumers <= MAX_CONSUMERS:
+            raise ValueError(f"consumers must be between 1 and {MAX_CONSUMERS}")
+        fields = [(field, tuple(shape), np.dtype(dtype).str) for field, shape, dtype in fields]
+        spec = json.dumps(fields).encode("utf-8")
+        if len(spec) > SPEC_BYTES:
+            raise ValueError("Too many ring fields")
+        spec_offset, _, _, size = _layout(fields, slots)
+
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = _open_untracked(name)
+            owner_pid = int(np.ndarray((HEADER_WORDS,), np.int64, stale.buf)[H_OWNER_PID])
+            if pid_alive(owner_pid) and owner_pid != os.getpid():
+                stale.close()
+                raise
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        header = np.ndarray((HEADER_WORDS,), np.int64, shm.buf)
+        header[:] = 0
+        header[H_SLOTS] = slots
+        header[H_CONSUMERS] = consumers
+        header[H_OWNER_PID] = os.getpid()
+        if supervised:
+            header[H_SUPERVISOR_PID] = os.getpid()
+        shm.buf[spec_offset:spec_offset + len(spec)] = spec
+        header[H_MAGIC] = MAGIC  # Written last: the ring is valid from here on
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(_open_untracked(name), owner=False)
+
+    @property
+    def head(self):
+        return int(self.header[H_HEAD])
+
+    def tail(self, consumer=0):
+        return int(self.header[H_TAILS + consumer])
+
+    @property
+    def closed(self):
+        return bool(self.header[H_CLOSED])
+
+    def _wait(self, ready, peer_pids, timeout):
+        """Poll until ready() with a short backoff; raise once the supervisor, or unsupervised a peer, is gone"""
+        delay = 0.0001
+        deadline = None if timeout is None else time.monotonic() + timeout
+        dead_since = None
+        supervisor = int(self.header[H_SUPERVISOR_PID])
+        while not ready():
+            now = time.monotonic()
+            if supervisor:
+                # The supervisor restarts dead peers (or stops everyone), so only its own death is fatal
+                if not pid_alive(supervisor):
+                    raise PeerDiedError(f"Supervisor of ring '{self.shm.name}' exited")
+            # A restarted peer re-registers its pid, so a dead pid is only fatal if it stays dead
+            elif all(pid_alive(int(pid)) for pid in peer_pids()):
+                dead_since = None
+            elif dead_since is None:
+                dead_since = now
+            elif now - dead_since > PEER_GRACE:
+                raise PeerDiedError(f"Peer of ring '{self.shm.name}' exited")
+            if deadline is not None and now > deadline:
+                raise TimeoutError(f"Timed out waiting on ring '{self.shm.name}'")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.002)
+
+    # Producer side
+
+    def reserve(self, timeout=None):
+        """Wait for a free slot and return (seq, {field: writable view})"""
+        self.header[H_PRODUCER_PID] = os.getpid()
+        tails = self.header[H_TAILS:H_TAILS + self.consumers]
+        # Consumers that haven't attached yet can't be dead, so only registered ones are checked
+        consumer_pids = lambda: [pid for pid in self.header[H_CONSUMER_PIDS:H_CONSUMER_PIDS + self.consumers] if pid]
+        self._wait(lambda: self.head - int(tails.min()) < self.slots, consumer_pids, timeout)
+        seq = self.head
+        slot = seq % self.slots
+        return seq, {name: array[slot] for name, array in self.arrays.items()}
+
+    def publish(self, frame_name=""):
+        """Make the reserved slot visible to consumers"""
+        slot = self.head % self.slots
+        encoded = frame_name.encode("utf-8")[:NAME_BYTES]
+        self.names[slot, :] = 0
+        self.names[slot, :len(encoded)] = np.frombuffer(encoded, np.uint8)
+        self.header[H_HEAD] = self.head + 1
+
+    def close_writer(self):
+        """Signal end of stream; consumers drain the remaining slots then get None"""
+        self.header[H_CLOSED] = 1
+
+    # Consumer side
+
+    def next(self, consumer=0, timeout=None):
+        """Wait for the next slot: (seq, frame name, {field: view}), or None at end of stream"""
+        self.header[H_CONSUMER_PIDS + consumer] = os.getpid()
+        tail = self.header[H_TAILS + consumer]
+        producer_pids = lambda: [self.header[H_PRODUCER_PID]] if self.header[H_PRODUCER_PID] else []
+        self._wait(lambda: self.header[H_HEAD] > tail or self.header[H_CLOSED], producer_pids, timeout)
+        if self.header[H_HEAD] <= tail:
+            return None
+        seq = int(tail)
+        slot = seq % self.slots
+        name = bytes(self.names[slot]).rstrip(b"\0").decode("utf-8")
+        return seq, name, {field: array[slot] for field, array in self.arrays.items()}
+
+    def release(self, consumer=0):
+        """Hand the current slot back to the producer"""
+        self.header[H_TAILS + consumer] += 1
+
+    # Lifetime
+
+    def close(self):
+        """Drop this process's mapping (views into the ring become invalid)"""
+        self.header = self.names = self.arrays = None
+        self.shm.close()
+
+    def unlink(self):
+        """Remove the segment; only the creating process should call this"""
+        self.shm.unlink()
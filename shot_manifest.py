@@ -0,0 +1,252 @@
+import os
+import time
+import json
+import sqlite3
+import hashlib
+
+OUTPUT_DIR = "output"
+MANIFEST_NAME = "manifest.sqlite"
+CONFIG_FILE = "config.json"
+MTIME_SLACK_NS = 2_000_000_000  # Directory mtimes this recent may still change within the same tick
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stages (
+    stage TEXT PRIMARY KEY,
+    dir_mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS frames (
+    stage TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT,
+    PRIMARY KEY (stage, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    children TEXT NOT NULL
+);
+"""
+
+def hash_bytes(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def hash_file(path):
+    with open(path, "rb") as f:
+        return hash_bytes(f.read())
+
+def hashing_enabled(config_file=CONFIG_FILE):
+    try:
+        with open(config_file, "r") as f:
+            return json.load(f).get("manifest_hashes", True)
+    except (OSError, ValueError):
+        return True
+
+def trusted_mtime(mtime_ns):
+    """Directory mtime to store, or 0 when it is so fresh that files added in the same tick could be missed"""
+    return mtime_ns if time.time_ns() - mtime_ns > MTIME_SLACK_NS else 0
+
+class ShotManifest:
+    """SQLite index of the frames in every output/<stage> directory.
+
+    Stages record the frames they write, so readers get frame lists, sizes,
+    mtimes and content hashes without listing or stat-ing every file. A
+    stage directory is only rescanned when its own mtime changed since the
+    last scan, which catches files added or removed by other tools (ffmpeg,
+    cleanup, hardlink fan-out). Nested directories are stages of their own,
+    named by their path under the output dir (e.g. "class_masks/person").
+
+    Rescans never read file contents: frames found that way have no hash
+    until hash_missing() is called. A file overwritten in place does not
+    change its directory's mtime, so its size and mtime stay stale until
+    sync(stage, force=True) compares every file's stat.
+    """
+
+    def __init__(self, output_dir=OUTPUT_DIR, path=None):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self.path = path or os.path.join(output_dir, MANIFEST_NAME)
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")  # Stages write while the GUI reads
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.hash_outputs = hashing_enabled()
+
+    def stage_dir(self, stage):
+        return os.path.join(self.output_dir, stage)
+
+    # Writers
+
+    def record(self, stage, name, data=None):
+        """Record a frame a stage just wrote; `data` (the encoded bytes) avoids re-reading it for the hash"""
+        path = os.path.join(self.stage_dir(stage), name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        digest = None
+        if data is not None:
+            digest = hash_bytes(data)
+        elif self.hash_outputs:
+            digest = hash_file(path)
+        self.db.execute(
+            "INSERT OR REPLACE INTO frames (stage, name, size, mtime_ns, hash) VALUES (?, ?, ?, ?, ?)",
+            (stage, name, st.st_size, st.st_mtime_ns, digest))
+        # Commit every frame: a write transaction left open between frames would lock out every
+        # other process that has to rescan this stage's (constantly changing) directory meanwhile
+        self.flush()
+
+    def flush(self):
+        self.db.commit()
+
+    def hash_missing(self, stage):
+        """Hash the frames of a stage that were found by a rescan rather than recorded"""
+        if not self.hash_outputs:
+            return
+        names = [name for (name,) in self.db.execute(
+            "SELECT name FROM frames WHERE stage = ? AND hash IS NULL", (stage,))]
+        for name in names:
+            try:
+                digest = hash_file(os.path.join(self.stage_dir(stage), name))
+            except OSError:
+                continue
+            self.db.execute("UPDATE frames SET hash = ? WHERE stage = ? AND name = ?", (digest, stage, name))
+            self.flush()
+
+    def sync(self, stage, force=False):
+        """Bring a stage up to date with its directory; a no-op if the directory is unchanged.
+
+        If another process holds the write lock for too long, the stage keeps
+        its last indexed state and is rescanned on the next call.
+        """
+        try:
+            self._sync(stage, force)
+        except sqlite3.OperationalError:
+            self.db.rollback()
+
+    def _sync(self, stage, force):
+        stage_dir = self.stage_dir(stage)
+        try:
+            dir_mtime = os.stat(stage_dir).st_mtime_ns
+        except OSError:
+            self.db.execute("DELETE FROM frames WHERE stage = ?", (stage,))
+            self.db.execute("DELETE FROM stages WHERE stage = ?", (stage,))
+            self.db.execute("DELETE FROM dirs WHERE path = ?", (stage,))
+            self.flush()
+            return
+
+        row = self.db.execute("SELECT dir_mtime_ns FROM stages WHERE stage = ?", (stage,)).fetchone()
+        if row and row[0] == dir_mtime and not force:
+            return
+
+        known = {name: (size, mtime) for name, size, mtime in
+                 self.db.execute("SELECT name, size, mtime_ns FROM frames WHERE stage = ?", (stage,))}
+        seen = set()
+        with os.scandir(stage_dir) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                seen.add(entry.name)
+                if known.get(entry.name) != (st.st_size, st.st_mtime_ns):
+                    # New or changed behind our back (ffmpeg, fan-out, other tools); hashed by hash_missing()
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO frames (stage, name, size, mtime_ns, hash) VALUES (?, ?, ?, ?, NULL)",
+                        (stage, entry.name, st.st_size, st.st_mtime_ns))
+        self.db.executemany("DELETE FROM frames WHERE stage = ? AND name = ?",
+                            [(stage, name) for name in known.keys() - seen])
+
+        self.db.execute("INSERT OR REPLACE INTO stages (stage, dir_mtime_ns) VALUES (?, ?)", (stage, trusted_mtime(dir_mtime)))
+        self.flush()
+
+    def _subdirs(self, path):
+        """Child directory names of output/<path>, listed again only when its mtime changed"""
+        directory = self.stage_dir(path) if path else self.output_dir
+        try:
+            dir_mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return []
+        row = self.db.execute("SELECT mtime_ns, children FROM dirs WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == dir_mtime:
+            return json.loads(row[1])
+        with os.scandir(directory) as entries:
+            children = sorted(entry.name for entry in entries if entry.is_dir())
+        try:
+            self.db.execute("INSERT OR REPLACE INTO dirs (path, mtime_ns, children) VALUES (?, ?, ?)",
+                            (path, trusted_mtime(dir_mtime), json.dumps(children)))
+            self.flush()
+        except sqlite3.OperationalError:
+            self.db.rollback()
+        return children
+
+    def sync_all(self):
+        """Sync every stage directory under the output dir, nested ones included, and forget removed ones.
+
+        Unchanged directories cost one stat each: their file and subdirectory
+        lists come from the manifest.
+        """
+        stages = []
+        pending = [""]
+        while pending:
+            parent = pending.pop()
+            for name in self._subdirs(parent):
+                stage = f"{parent}/{name}" if parent else name
+                stages.append(stage)
+                pending.append(stage)
+        for stage in stages:
+            self.sync(stage)
+        for (stage,) in self.db.execute("SELECT stage FROM stages").fetchall():
+            if stage not in stages:
+                self.sync(stage)
+        return sorted(stages)
+
+    # Readers
+
+    def frames(self, stage, extensions=None, sync=True):
+        """Sorted frame names of a stage, optionally filtered by extension"""
+        if sync:
+            self.sync(stage)
+        names = [name for (name,) in self.db.execute(
+            "SELECT name FROM frames WHERE stage = ? ORDER BY name", (stage,))]
+        if extensions:
+            names = [name for name in names if name.lower().endswith(extensions)]
+        return names
+
+    def frame_set(self, stage, sync=True):
+        return set(self.frames(stage, sync=sync))
+
+    def frames_by_stem(self, stage, extensions=None, sync=True):
+        """Name stem -> frame name, to find a frame whatever codec its stage wrote"""
+        return {os.path.splitext(name)[0]: name for name in self.frames(stage, extensions, sync)}
+
+    def rows(self, stage, sync=True):
+        """(name, size, mtime_ns, hash) for every frame of a stage, sorted by name"""
+        if sync:
+            self.sync(stage)
+        return self.db.execute(
+            "SELECT name, size, mtime_ns, hash FROM frames WHERE stage = ? ORDER BY name", (stage,)).fetchall()
+
+    def stages(self, sync=True):
+        """(stage, frame count, total bytes) for every known stage"""
+        if sync:
+            self.sync_all()
+        return self.db.execute(
+            "SELECT s.stage, COUNT(f.name), COALESCE(SUM(f.size), 0) FROM stages s "
+            "LEFT JOIN frames f ON f.stage = s.stage GROUP BY s.stage ORDER BY s.stage").fetchall()
+
+    def close(self):
+        self.db.close()
+
+_manifests = {}
+
+def open_manifest(output_dir=OUTPUT_DIR):
+    """Shared manifest for this process"""
+    if output_dir not in _manifests:
+        _manifests[output_dir] = ShotManifest(output_dir)
+    return _manifests[output_dir]
+
+def list_frames(directory, extensions=(".png",)):
+    """Sorted frame names of a stage directory (output/<stage>) via its manifest"""
+    output_dir, stage = os.path.split(os.path.normpath(directory))
+    return open_manifest(output_dir or ".").frames(stage, extensions)
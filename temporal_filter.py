@@ -0,0 +1,189 @@
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from tqdm import tqdm
+from runtime_config import apply_runtime_config, stage_setting
+from progress_events import StageReporter
+from shot_manifest import open_manifest
+from deduplicate_frames import frame_stem, prefetch
+from codecs_io import READ_EXTENSIONS, stage_codec, frame_name, read_image, write_image
+from memory_governor import MemoryGovernor
+
+OUTPUT_ROOT = "output"
+FRAMES_STAGE = "original_frames"
+INPUT_STAGE = "refined_masks"
+OUTPUT_STAGE = "stable_masks"
+
+RADIUS = 2               # Frames on each side of the filtered frame; the window is 2 * RADIUS + 1
+MODES = ["mean", "median"]
+WORKERS = stage_setting("workers", min(4, os.cpu_count() or 1), "temporal_filter")  # Decode threads
+PREFETCH = 2 * WORKERS
+
+# Farneback parameters: pyramid scale, levels, window, iterations, poly_n, poly_sigma, flags
+FLOW_PARAMS = (0.5, 3, 15, 3, 5, 1.2, 0)
+
+def window_weights(radius):
+    """Triangular weights over the window: the center frame counts most"""
+    return (radius + 1 - np.abs(np.arange(-radius, radius + 1))).astype(np.float32)
+
+def flow_map(grid, source, target):
+    """Absolute remap coordinates that bring an image of `target` into the pixel grid of `source`"""
+    flow = cv2.calcOpticalFlowFarneback(source, target, None, *FLOW_PARAMS)
+    flow += grid
+    return flow
+
+class TemporalFilter:
+    """Centered temporal filter over a sliding window of masks held in preallocated rings.
+
+    Masks are pushed in frame order and each is stored once in a (K, H, W)
+    ring, K = 2 * radius + 1. With motion compensation the adjacent-frame
+    Farneback flows are kept in two more rings and neighbours are warped to
+    the center frame by chaining them, so memory is O(K x frame) whatever the
+    length of the shot.
+    """
+
+    def __init__(self, count, radius=RADIUS, mode="mean", motion=False, binary=False):
+        self.count = count
+        self.radius = radius
+        self.k = 2 * radius + 1
+        self.mode = mode
+        self.motion = motion
+        self.binary = binary
+        self.weights = window_weights(radius)
+        self.ring = None
+        self.received = 0
+        self.previous_gray = None
+
+    def _allocate(self, shape):
+        self.shape = shape
+        self.ring = np.empty((self.k,) + shape, np.uint8)
+        if self.motion:
+            height, width = shape
+            x, y = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+            self.grid = np.dstack([x, y])
+            # forward[j]: brings frame j + 1 into frame j; backward[j]: brings frame j into frame j + 1
+            self.forward = np.empty((self.k,) + shape + (2,), np.float32)
+            self.backward = np.empty((self.k,) + shape + (2,), np.float32)
+            self.warped = np.empty_like(self.ring)
+
+    def push(self, mask, gray=None):
+        """Add the next mask (and its frame, in gray at mask size, for motion compensation)"""
+        if self.ring is None:
+            self._allocate(mask.shape)
+        index = self.received
+        self.ring[index % self.k] = mask
+        if self.motion:
+            if self.previous_gray is not None:
+                slot = (index - 1) % self.k
+                self.forward[slot] = flow_map(self.grid, self.previous_gray, gray)
+                self.backward[slot] = flow_map(self.grid, gray, self.previous_gray)
+            self.previous_gray = gray
+        self.received += 1
+
+    def ready(self, t):
+        """True once every frame of t's window that exists has been pushed"""
+        return self.received >= min(t + self.radius + 1, self.count)
+
+    def _warp_to(self, t, s):
+        """Mask s carried into frame t's pixel grid by chaining adjacent flows"""
+        mask = self.ring[s % self.k]
+        if s > t:
+            for j in range(s - 1, t - 1, -1):
+                mask = cv2.remap(mask, self.forward[j % self.k], None, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        else:
+            for j in range(s, t):
+                mask = cv2.remap(mask, self.backward[j % self.k], None, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        return mask
+
+    def filter(self, t):
+        """Stabilized mask for frame t; frames outside the shot are left out of the window"""
+        frames = range(max(0, t - self.radius), min(self.count - 1, t + self.radius) + 1)
+        stack = self.ring
+        if self.motion:
+            stack = self.warped
+            for s in frames:
+                stack[s % self.k] = self.ring[s % self.k] if s == t else self._warp_to(t, s)
+        slots = [s % self.k for s in frames]
+
+        if self.mode == "median":
+            result = np.median(stack[slots], axis=0)
+        else:
+            weights = np.zeros(self.k, np.float32)
+            weights[slots] = self.weights[[s - t + self.radius for s in frames]]
+            result = np.tensordot(weights / weights.sum(), stack, axes=1)
+
+        if self.binary:
+            return np.where(result >= 128, np.uint8(255), np.uint8(0))
+        return np.clip(result + 0.5, 0, 255).astype(np.uint8)
+
+def load_inputs(paths):
+    mask_path, frame_path = paths
+    mask = read_image(mask_path, cv2.IMREAD_GRAYSCALE)
+    gray = None
+    if mask is not None and frame_path:
+        frame = cv2.imread(frame_path, cv2.IMREAD_GRAYSCALE)
+        if frame is not None:
+            gray = cv2.resize(frame, (mask.shape[1], mask.shape[0]), interpolation=cv2.INTER_AREA)
+    return mask, gray
+
+def stabilize_shot(input_stage=INPUT_STAGE, radius=RADIUS, mode="mean", motion=False, binary=False):
+    """Filter every mask of a stage over time, reading each mask (and frame) exactly once"""
+    manifest = open_manifest(OUTPUT_ROOT)
+    mask_files = manifest.frames(input_stage, READ_EXTENSIONS)
+    if not mask_files:
+        print(f"No masks found in {os.path.join(OUTPUT_ROOT, input_stage)}!")
+        return
+    frames = manifest.frames_by_stem(FRAMES_STAGE) if motion else {}
+    if motion and len(frames) < len(mask_files):
+        print("Some original frames are missing; motion compensation needs every frame")
+        return
+
+    output_dir = os.path.join(OUTPUT_ROOT, OUTPUT_STAGE)
+    os.makedirs(output_dir, exist_ok=True)
+    fmt, level = stage_codec(OUTPUT_STAGE)
+    inputs = [(os.path.join(OUTPUT_ROOT, input_stage, name),
+               os.path.join(OUTPUT_ROOT, FRAMES_STAGE, frames[frame_stem(name)]) if motion else None)
+              for name in mask_files]
+
+    temporal = TemporalFilter(len(mask_files), radius, mode, motion, binary)
+    reporter = StageReporter("temporal_filter", len(mask_files))
+    governor = MemoryGovernor("temporal_filter")
+    governor.knob("prefetch", PREFETCH)
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        loaded = prefetch(executor, load_inputs, inputs, governor=governor)
+        for t, name in enumerate(tqdm(mask_files, desc="Stabilizing masks")):
+            start = time.perf_counter()
+            while not temporal.ready(t):
+                mask, gray = next(loaded)
+                if mask is None:
+                    raise RuntimeError(f"Failed to read mask {mask_files[temporal.received]}")
+                if temporal.ring is not None and mask.shape != temporal.shape:
+                    mask = cv2.resize(mask, temporal.shape[::-1], interpolation=cv2.INTER_NEAREST)
+                    gray = None if gray is None else cv2.resize(gray, temporal.shape[::-1], interpolation=cv2.INTER_AREA)
+                temporal.push(mask, gray)
+
+            output_file = frame_name(name, fmt)
+            data = write_image(os.path.join(output_dir, output_file), temporal.filter(t), fmt, level)
+            manifest.record(OUTPUT_STAGE, output_file, data)
+            reporter.frame_done(name, time.perf_counter() - start)
+
+    manifest.flush()
+    reporter.finish()
+
+def main():
+    apply_runtime_config("temporal_filter")
+    parser = argparse.ArgumentParser(description="Reduce mask flicker with a sliding-window temporal filter")
+    parser.add_argument("--input", default=INPUT_STAGE, help="Stage directory under output/ holding the masks")
+    parser.add_argument("--radius", type=int, default=RADIUS, help="Frames on each side; the window is 2 * radius + 1")
+    parser.add_argument("--mode", choices=MODES, default="mean", help="mean: triangular weighted mean; median: per-pixel median")
+    parser.add_argument("--motion", action="store_true", help="Warp neighbours to each frame with optical flow first")
+    parser.add_argument("--binary", action="store_true", help="Threshold the result back to a 0/255 mask")
+    args = parser.parse_args()
+    stabilize_shot(args.input, args.radius, args.mode, args.motion, args.binary)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+import threading
+import cv2
+import numpy as np
+from codecs_io import read_image
+
+CONFIG_FILE = "config.json"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ai_vfx_thumbnails")
+DEFAULT_MAX_MB = 512
+DEFAULT_SIZE = 160
+JPEG_QUALITY = 80
+
+def load_settings(config_file=CONFIG_FILE):
+    """Read the optional "thumbnail_cache" block from config.json"""
+    try:
+        with open(config_file, "r") as f:
+            return json.load(f).get("thumbnail_cache", {})
+    except (OSError, ValueError):
+        return {}
+
+def make_thumbnail(path, size=DEFAULT_SIZE):
+    """Decode an image and return a JPEG thumbnail (bytes) no larger than size x size"""
+    image = read_image(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None
+
+    if image.dtype == np.uint16:
+        image = (image >> 8).astype(np.uint8)
+    elif image.dtype != np.uint8:
+        image = cv2.normalize(image, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+
+    height, width = image.shape[:2]
+    scale = min(size / width, size / height, 1.0)
+    if scale < 1.0:
+        image = cv2.resize(image, (max(int(width * scale), 1), max(int(height * scale), 1)), interpolation=cv2.INTER_AREA)
+
+    if image.ndim == 3 and image.shape[2] == 4:
+        # Show transparency against mid-gray
+        alpha = image[:, :, 3:4].astype(np.uint16)
+        image = ((image[:, :, :3] * alpha + 128 * (255 - alpha)) // 255).astype(np.uint8)
+
+    ok, encoded = cv2.imencode(".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+    return encoded.tobytes() if ok else None
+
+class ThumbnailCache:
+    """Persistent, size-bounded thumbnail cache keyed by path + mtime.
+
+    Thumbnails are JPEG files under cache_dir. When the cache grows past
+    max_mb the least recently used entries are deleted. Safe to use from
+    several threads at once.
+    """
+
+    def __init__(self, cache_dir=None, max_mb=None, size=None):
+        settings = load_settings()
+        self.cache_dir = cache_dir or settings.get("dir", DEFAULT_CACHE_DIR)
+        self.max_bytes = int((max_mb or settings.get("max_mb", DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.size = size or settings.get("size", DEFAULT_SIZE)
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self):
+        for bucket in os.scandir(self.cache_dir):
+            if bucket.is_dir():
+                for entry in os.scandir(bucket.path):
+                    if entry.name.endswith(".jpg"):
+                        yield entry
+
+    def key(self, path):
+        """Cache key for the current version of path, or None if it is gone"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        ident = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{self.size}"
+        return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".jpg")
+
+    def get(self, path):
+        """Return JPEG thumbnail bytes for path, generating and storing them on a miss"""
+        key = self.key(path)
+        if key is None:
+            return None
+        entry_path = self.entry_path(key)
+
+        try:
+            with open(entry_path, "rb") as f:
+                data = f.read()
+            os.utime(entry_path)  # Mark as recently used
+            return data
+        except OSError:
+            pass
+
+        data = make_thumbnail(path, self.size)
+        if data is not None:
+            self.put(entry_path, data)
+        return data
+
+    def put(self, entry_path, data):
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        temp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, entry_path)
+
+        with self.lock:
+            self.total_bytes += len(data)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """Delete least recently used thumbnails until the cache is at 90% of its limit"""
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        target = int(self.max_bytes * 0.9)
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.unlink(entry.path)
+                total -= size
+            except OSError:
+                continue
+        self.total_bytes = total